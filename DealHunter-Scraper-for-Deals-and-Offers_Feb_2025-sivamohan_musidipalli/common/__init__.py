@@ -0,0 +1,2 @@
+# common/__init__.py
+# Helpers shared by the week1, week2 and task4 scrapers.
@@ -0,0 +1,88 @@
+# chunking.py
+#
+# Split page Markdown into LLM-sized chunks on listing boundaries.
+#
+# content_extraction puts a LISTING_MARKER line before every listing it finds
+# in the DOM. The chunker cuts the Markdown at those lines and packs whole
+# listings into chunks up to a token budget, with no overlap. A listing that
+# doesn't fit the budget on its own is split at paragraph, then line
+# boundaries. Markdown without markers (no listing region on the page, or a
+# table) is packed paragraph by paragraph.
+
+import re
+
+from common.content_extraction import LISTING_MARKER
+
+_MARKER_LINE = re.compile(r"^[ \t]*" + re.escape(LISTING_MARKER) + r"[ \t]*(?:\n|$)", re.MULTILINE)
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+_BLANK_RUN = re.compile(r"\n{3,}")
+
+SEPARATOR = "\n\n"
+
+
+def strip_listing_markers(markdown):
+    """Remove listing markers, e.g. before Markdown is saved or shown."""
+    return _BLANK_RUN.sub("\n\n", _MARKER_LINE.sub("", markdown))
+
+
+def _split_oversized(text, max_tokens, count_tokens):
+    """Cut `text` at paragraph, then line, then character boundaries until each piece fits."""
+    parts = [part for part in _PARAGRAPH_BREAK.split(text) if part.strip()]
+    if len(parts) < 2:
+        parts = [part for part in text.split("\n") if part.strip()]
+    if len(parts) < 2:
+        middle = len(text) // 2
+        parts = [text[:middle], text[middle:]]
+
+    pieces = []
+    for part in parts:
+        tokens = count_tokens(part)
+        if tokens <= max_tokens or len(part) < 2:
+            pieces.append((part, tokens))
+        else:
+            pieces.extend(_split_oversized(part, max_tokens, count_tokens))
+    return pieces
+
+
+def chunk_by_listings(markdown, max_tokens, count_tokens):
+    """
+    Split `markdown` into chunks of at most `max_tokens`, as measured by
+    `count_tokens(text)`, without cutting a listing in half.
+    Returns (chunks, stats); stats counts the chunks and the listings that
+    had to be split because they alone exceed the budget.
+    """
+    segments = _MARKER_LINE.split(markdown)
+    listing_aware = len(segments) > 1
+    if not listing_aware:
+        segments = _PARAGRAPH_BREAK.split(markdown)
+
+    pieces = []
+    split_listings = 0
+    for segment in segments:
+        segment = segment.strip("\n")
+        if not segment.strip():
+            continue
+        tokens = count_tokens(segment)
+        if tokens <= max_tokens:
+            pieces.append((segment, tokens))
+        else:
+            split_listings += listing_aware
+            pieces.extend(_split_oversized(segment, max_tokens, count_tokens))
+
+    # Greedy packing in document order; pieces are never repeated across chunks
+    chunks = []
+    current, current_tokens = [], 0
+    for piece, tokens in pieces:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(SEPARATOR.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(SEPARATOR.join(current))
+
+    return chunks, {
+        "chunks": len(chunks),
+        "listing_aware_chunks": listing_aware,
+        "split_listings": split_listings,
+    }
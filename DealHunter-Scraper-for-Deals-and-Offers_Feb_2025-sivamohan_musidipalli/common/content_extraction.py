@@ -0,0 +1,252 @@
+# content_extraction.py
+#
+# Main-content extraction between fetching a page and turning it into Markdown.
+#
+# Rendered pages carry navigation menus, sidebars, cookie banners and
+# "related" widgets that we would otherwise pay for in LLM tokens. This stage:
+#
+# 1. Finds listing regions: containers with several sibling blocks of the same
+#    shape (tag + classes) that each hold real content (a few text runs or an
+#    image). Listings, their contents and their ancestors are never removed.
+# 2. Drops boilerplate: <nav>/<aside>-like elements, blocks whose id/class
+#    looks like a banner or widget, and link farms (high link density).
+# 3. Narrows to <main> (or role="main") when it holds every listing region and
+#    most of the remaining text.
+#
+# With mark_listings=True a LISTING_MARKER paragraph is put before every listing
+# (and after the last one) so the Markdown can be chunked on listing boundaries.
+
+import re
+
+from bs4 import BeautifulSoup, Comment, Tag
+
+try:
+    import lxml  # noqa: F401
+    _PARSER = "lxml"
+except ImportError:
+    _PARSER = "html.parser"
+
+MIN_REPEATS = 3              # sibling blocks of one shape that make a listing
+MIN_ITEM_TEXT = 15           # median characters of text per listing item
+MAX_LINK_DENSITY = 0.6       # share of a block's text that may be link text
+MIN_LINKS_FOR_FARM = 3       # a block needs this many links to count as a link farm
+MAIN_TEXT_SHARE = 0.5        # <main> must hold this share of the text to be used alone
+
+DROPPED_TAGS = ("script", "style", "noscript", "template", "iframe", "svg", "canvas")
+BOILERPLATE_TAGS = ("nav", "aside")
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog"}
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|consent|gdpr|newsletter|subscribe|related|recommend|sidebar|social|share|"
+    r"breadcrumb|navbar|menu|popup|modal|overlay|advert|sponsor",
+    re.IGNORECASE
+)
+# A pattern match is only trusted on blocks without much running text
+BOILERPLATE_MAX_TEXT = 500
+
+LISTING_MARKER = "%%listing%%"
+# Markers can't sit between table rows, so tables are chunked by line instead
+TABLE_ITEM_TAGS = {"tr", "td", "th", "thead", "tbody", "tfoot"}
+
+BLOCK_TAGS = {
+    "div", "section", "aside", "nav", "ul", "ol", "dl", "table", "form",
+    "header", "footer", "article", "p", "span",
+}
+
+
+class _Stats:
+    __slots__ = ("text", "link_text", "links")
+
+    def __init__(self):
+        self.text = 0
+        self.link_text = 0
+        self.links = 0
+
+    @property
+    def link_density(self):
+        return self.link_text / self.text if self.text else 0.0
+
+
+def _measure(root):
+    """Text length, link-text length and link count of every tag, in one post-order walk."""
+    stats = {}
+    stack = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if isinstance(child, Tag))
+            continue
+        s = _Stats()
+        for child in node.children:
+            if isinstance(child, Tag):
+                c = stats[id(child)]
+                s.text += c.text
+                s.link_text += c.link_text
+                s.links += c.links
+            elif not isinstance(child, Comment):
+                s.text += len(child.strip())
+        if node.name == "a":
+            s.link_text = s.text
+            s.links += 1
+        stats[id(node)] = s
+    return stats
+
+
+def _signature(tag):
+    return tag.name, tuple(sorted(tag.get("class") or ()))
+
+
+def _is_listing_item(tag):
+    # Cards carry several separate bits of text (title, price, ...) or a picture
+    text_runs = 0
+    for _ in tag.stripped_strings:
+        text_runs += 1
+        if text_runs >= 2:
+            return True
+    return tag.find("img") is not None
+
+
+def listing_items(parent, stats):
+    """The repeated children of `parent` that make it a listing region, or None."""
+    children = [child for child in parent.children if isinstance(child, Tag)]
+    if len(children) < MIN_REPEATS:
+        return None
+    groups = {}
+    for child in children:
+        groups.setdefault(_signature(child), []).append(child)
+    items = max(groups.values(), key=len)
+    if len(items) < MIN_REPEATS:
+        return None
+    lengths = sorted(stats[id(item)].text for item in items)
+    if lengths[len(lengths) // 2] < MIN_ITEM_TEXT:
+        return None
+    rich = sum(1 for item in items if _is_listing_item(item))
+    return items if rich * 2 >= len(items) else None
+
+
+def find_listing_regions(root, stats):
+    """Containers whose children repeat one shape often enough to be a listing."""
+    regions = [parent for parent in [root] + root.find_all(True) if listing_items(parent, stats)]
+    # Keep only the outermost of nested regions (e.g. a grid of card grids)
+    region_ids = {id(region) for region in regions}
+    return [r for r in regions if not any(id(p) in region_ids for p in r.parents)]
+
+
+def _is_boilerplate(tag, stats):
+    s = stats[id(tag)]
+    if tag.name in BOILERPLATE_TAGS:
+        return True
+    if (tag.get("role") or "").lower() in BOILERPLATE_ROLES:
+        return True
+    if tag.get("aria-hidden") == "true" or tag.has_attr("hidden"):
+        return True
+    marker = " ".join([tag.get("id") or ""] + list(tag.get("class") or ()))
+    if marker.strip() and BOILERPLATE_PATTERN.search(marker) and s.text < BOILERPLATE_MAX_TEXT:
+        return True
+    if tag.name in BLOCK_TAGS and s.links >= MIN_LINKS_FOR_FARM and s.link_density > MAX_LINK_DENSITY:
+        return True
+    return False
+
+
+def _mark_listings(soup, regions, stats):
+    """Put a LISTING_MARKER paragraph before every listing item and after the last one."""
+    marked = 0
+    for region in regions:
+        items = listing_items(region, stats)
+        if items[0].name in TABLE_ITEM_TAGS:
+            continue
+        for item in items:
+            item.insert_before(_marker(soup))
+        items[-1].insert_after(_marker(soup))
+        marked += len(items)
+    return marked
+
+
+def _marker(soup):
+    marker = soup.new_tag("p")
+    marker.string = LISTING_MARKER
+    return marker
+
+
+def _parse(html_content):
+    soup = BeautifulSoup(html_content, _PARSER)
+    for element in soup.find_all(DROPPED_TAGS):
+        element.decompose()
+    for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+        comment.extract()
+    return soup
+
+
+def find_listings(html_content):
+    """Parse `html_content` and return [(region, items)] for its listing regions, most items first."""
+    soup = _parse(html_content)
+    root = soup.body or soup
+    stats = _measure(root)
+    listings = [(region, listing_items(region, stats)) for region in find_listing_regions(root, stats)]
+    return sorted(listings, key=lambda listing: len(listing[1]), reverse=True)
+
+
+def mark_listing_boundaries(html_content):
+    """Only mark listings (see extract_main_content), without removing anything."""
+    soup = _parse(html_content)
+    root = soup.body or soup
+    stats = _measure(root)
+    _mark_listings(soup, find_listing_regions(root, stats), stats)
+    return str(soup)
+
+
+def extract_main_content(html_content, mark_listings=False, removed_html=None):
+    """
+    Strip boilerplate from `html_content` while keeping listing regions.
+    Returns (html, stats) where stats counts what was kept and removed.
+    Pass a list as `removed_html` to collect the HTML of everything dropped
+    (boilerplate blocks, and the page outside <main> when narrowed to it).
+    """
+    soup = _parse(html_content)
+    root = soup.body or soup
+    stats = _measure(root)
+    regions = find_listing_regions(root, stats)
+
+    region_ids = {id(region) for region in regions}
+    ancestor_ids = {id(parent) for region in regions for parent in region.parents}
+
+    # Top-down, so a removed block takes its descendants with it
+    removed = 0
+    stack = [child for child in root.children if isinstance(child, Tag)]
+    while stack:
+        tag = stack.pop()
+        if id(tag) in region_ids:
+            continue  # nothing inside a listing is pruned
+        if id(tag) not in ancestor_ids and _is_boilerplate(tag, stats):
+            if removed_html is not None:
+                removed_html.append(str(tag))
+            tag.decompose()
+            removed += 1
+            continue
+        stack.extend(child for child in tag.children if isinstance(child, Tag))
+
+    narrowed = False
+    main = root.find("main") or root.find(attrs={"role": "main"})
+    if main is not None:
+        remaining = _measure(root)
+        main_ids = {id(tag) for tag in main.find_all(True)} | {id(main)}
+        holds_listings = all(id(region) in main_ids for region in regions)
+        if holds_listings and remaining[id(main)].text >= MAIN_TEXT_SHARE * remaining[id(root)].text:
+            root = main
+            narrowed = True
+
+    marked = _mark_listings(soup, regions, stats) if mark_listings else 0
+
+    html = str(root)
+    if narrowed and removed_html is not None:
+        page = soup.body or soup
+        main.extract()
+        removed_html.append(str(page))
+    return html, {
+        "listing_regions": len(regions),
+        "listings_marked": marked,
+        "removed_blocks": removed,
+        "narrowed_to_main": narrowed,
+        "bytes_before": len(html_content),
+        "bytes_after": len(html),
+    }
@@ -0,0 +1,167 @@
+# extraction.py
+#
+# Declarative extraction specs compiled into single-pass extractors.
+#
+# A spec names the repeated items on a page and, per field, the element that
+# holds the value:
+#
+#     {
+#         "container": {"tag": "table"},               # optional: search inside the first match
+#         "item": {"tag": "div", "class": "card"},
+#         "skip_if": {"tag": "div", "class": "ad"},    # optional: drop items containing this
+#         "default": "N/A",                            # for fields whose element is missing
+#         "fields": {
+#             "Name":  {"tag": "h3"},                                # stripped text
+#             "Image": {"tag": "img", "attr": ["data-src", "src"]},  # first non-empty attribute
+#             "Link":  {"tag": "a", "class": "btn", "attr": "href", "post": absolute_url},
+#             "Cells": {"tag": "td", "many": True, "strip_each": True},
+#             "Store": {"context": "store_name"},                    # copied from the caller
+#         },
+#     }
+#
+# compile_spec() turns a spec into an Extractor that walks each item's subtree
+# once and fills every field from that walk: the first matching element
+# (find() semantics) or, for "many" fields, all of them in document order.
+
+from urllib.parse import urljoin
+
+from bs4 import Tag
+
+_SKIP = object()
+
+
+# -------------------------------------------------------------------
+# Post-processing helpers for specs
+# -------------------------------------------------------------------
+def absolute_url(value, context):
+    """Resolve `value` against context["base_url"]."""
+    return urljoin(context["base_url"], value)
+
+
+def https_if_protocol_relative(value, context):
+    """Turn //host/path into https://host/path; leave everything else alone."""
+    if value and value.startswith("//"):
+        return f"https:{value}"
+    return value
+
+
+class _Field:
+    __slots__ = ("name", "tag", "cls", "attr", "many", "strip_each", "post", "context_key")
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.tag = spec.get("tag")
+        self.cls = spec.get("class")
+        self.attr = spec.get("attr")
+        self.many = spec.get("many", False)
+        self.strip_each = spec.get("strip_each", False)
+        self.post = spec.get("post")
+        self.context_key = spec.get("context")
+
+    def value(self, node, context):
+        if isinstance(self.attr, str):
+            # A single attribute is required, like tag["href"]
+            value = node[self.attr]
+        elif self.attr:
+            value = None
+            for attr in self.attr:
+                value = node.get(attr)
+                if value:
+                    break
+        elif self.strip_each:
+            value = node.get_text(strip=True)
+        else:
+            value = node.text.strip()
+        if self.post is not None:
+            value = self.post(value, context)
+        return value
+
+
+class Extractor:
+    """A compiled spec. Use compile_spec() to build one."""
+
+    def __init__(self, spec):
+        self.container = spec.get("container")
+        self.item = spec["item"]
+        self.default = spec.get("default")
+        self.fields = [_Field(name, field) for name, field in spec["fields"].items()]
+
+        # tag name -> [(class or None, field name or _SKIP)], so one walk checks every field
+        self._matchers = {}
+        skip_if = spec.get("skip_if")
+        if skip_if:
+            self._matchers.setdefault(skip_if["tag"], []).append((skip_if.get("class"), _SKIP))
+        for field in self.fields:
+            if field.context_key is None:
+                self._matchers.setdefault(field.tag, []).append((field.cls, field.name))
+        self._many = {field.name for field in self.fields if field.many}
+
+    def extract(self, root, context=None):
+        """
+        Return one dict per item under `root` (None when a container is
+        specified but missing). Items that fail to extract are skipped.
+        """
+        context = context or {}
+        if self.container:
+            root = _find(root, self.container)
+            if root is None:
+                return None
+
+        rows = []
+        for item in _find_all(root, self.item):
+            try:
+                row = self._extract_item(item, context)
+            except Exception:
+                continue
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def _extract_item(self, item, context):
+        found = {}
+        many = {name: [] for name in self._many}
+        for node in item.descendants:
+            if not isinstance(node, Tag):
+                continue
+            matchers = self._matchers.get(node.name)
+            if not matchers:
+                continue
+            classes = node.get("class") or ()
+            for cls, name in matchers:
+                if cls is not None and cls not in classes:
+                    continue
+                if name is _SKIP:
+                    return None
+                if name in many:
+                    many[name].append(node)
+                elif name not in found:
+                    found[name] = node
+
+        row = {}
+        for field in self.fields:
+            if field.context_key is not None:
+                row[field.name] = context[field.context_key]
+            elif field.many:
+                row[field.name] = [field.value(node, context) for node in many[field.name]]
+            elif field.name in found:
+                row[field.name] = field.value(found[field.name], context)
+            else:
+                row[field.name] = self.default
+        return row
+
+
+def _find(root, selector):
+    if selector.get("class"):
+        return root.find(selector["tag"], class_=selector["class"])
+    return root.find(selector["tag"])
+
+
+def _find_all(root, selector):
+    if selector.get("class"):
+        return root.find_all(selector["tag"], class_=selector["class"])
+    return root.find_all(selector["tag"])
+
+
+def compile_spec(spec):
+    """Compile a declarative spec (see module comment) into an Extractor."""
+    return Extractor(spec)
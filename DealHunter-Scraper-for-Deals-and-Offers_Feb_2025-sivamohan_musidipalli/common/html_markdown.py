@@ -0,0 +1,159 @@
+# html_markdown.py
+#
+# Single-pass HTML -> Markdown for the LLM scrapers.
+#
+# The previous path parsed the page with BeautifulSoup to drop <header> and
+# <footer>, serialised the tree back to a string and let html2text parse it a
+# second time. Here html2text's own parser skips the removed subtrees while it
+# walks the markup, so the document is parsed once and never copied.
+
+import html
+import re
+
+import html2text
+
+DEFAULT_REMOVED_TAGS = ("header", "footer")
+
+# Elements without a closing tag never sit on the open-element stack
+VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr",
+})
+
+_SERIALISED_ESCAPES = {"&", "<", ">"}
+_SPLIT_ESCAPES = re.compile(r"([&<>])")
+
+
+class FilteringHTML2Text(html2text.HTML2Text):
+    """
+    html2text converter that drops whole elements (default: header and footer)
+    during parsing. Unclosed elements are closed the way BeautifulSoup closes
+    them, by the end tag of an ancestor, so a stray <header> can't swallow the page.
+    """
+
+    def __init__(self, remove_tags=DEFAULT_REMOVED_TAGS, **kwargs):
+        super().__init__(**kwargs)
+        self.remove_tags = frozenset(tag.lower() for tag in remove_tags)
+        self._open = []          # names of currently open elements
+        self._skip_from = None   # stack index of the removed element we are inside
+        self._text = []          # pieces of the current text node
+
+    @property
+    def skipping(self):
+        return self._skip_from is not None
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+            if not self.skipping and tag in self.remove_tags:
+                self._skip_from = len(self._open) - 1
+        if not self.skipping:
+            super().handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if tag in VOID_TAGS:
+            if not self.skipping:
+                super().handle_endtag(tag)
+            return
+        if tag not in self._open:
+            return  # stray end tag; BeautifulSoup drops these too
+
+        # An end tag also closes everything opened after its start tag; pass
+        # those on explicitly, as the serialised soup used to
+        index = len(self._open) - 1 - self._open[::-1].index(tag)
+        closed = self._open[index:]
+        del self._open[index:]
+        skip_from = self._skip_from
+        if skip_from is not None and index <= skip_from:
+            self._skip_from = None
+        for depth in range(len(closed) - 1, -1, -1):
+            if skip_from is None or index + depth < skip_from:
+                super().handle_endtag(closed[depth])
+
+    # html2text's spacing depends on how text arrives, so each text node is
+    # handed over in one piece, split only where the serialised soup had an
+    # escape (&amp; &lt; &gt;), exactly as the old two-pass path delivered it
+    def handle_data(self, data, entity_char=False):
+        if self.skipping:
+            return
+        for piece in _SPLIT_ESCAPES.split(data):
+            if piece in _SERIALISED_ESCAPES:
+                self._flush_text()
+                super().handle_data(piece, True)
+            elif piece:
+                self._text.append(piece)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def handle_decl(self, decl):
+        self._flush_text()
+
+    def handle_pi(self, data):
+        self._flush_text()
+
+    def close(self):
+        super().close()
+        self._flush_text()
+
+    def _flush_text(self):
+        if self._text:
+            text = "".join(self._text)
+            self._text.clear()
+            super().handle_data(text)
+
+    # References are decoded to plain text like BeautifulSoup did
+    def handle_charref(self, c):
+        self.handle_data(html.unescape(f"&#{c};"))
+
+    def handle_entityref(self, c):
+        text = html.unescape(f"&{c};")
+        # Unknown entities stay literal; BeautifulSoup kept them without the ";"
+        self.handle_data(f"&{c}" if text == f"&{c};" else text)
+
+
+def html_to_markdown(html_content, remove_tags=DEFAULT_REMOVED_TAGS, ignore_links=False, body_width=None):
+    """
+    Convert `html_content` to Markdown in one parse, dropping every element named in
+    `remove_tags`. `body_width=None` keeps html2text's default line wrapping.
+    """
+    converter = FilteringHTML2Text(remove_tags=remove_tags)
+    converter.ignore_links = ignore_links
+    if body_width is not None:
+        converter.body_width = body_width
+    return converter.handle(html_content)
+
+
+if __name__ == "__main__":
+    # Check equivalence and speed against the old BeautifulSoup round trip:
+    #   python -m common.html_markdown task4/output/debug.html
+    import argparse
+    import time
+
+    from bs4 import BeautifulSoup
+
+    def two_pass(html_content):
+        soup = BeautifulSoup(html_content, "html.parser")
+        for element in soup.find_all(list(DEFAULT_REMOVED_TAGS)):
+            element.decompose()
+        converter = html2text.HTML2Text()
+        converter.ignore_links = False
+        return converter.handle(str(soup))
+
+    parser = argparse.ArgumentParser(description="Compare single-pass and two-pass Markdown conversion.")
+    parser.add_argument("files", nargs="+", help="saved HTML pages")
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            page = f.read()
+        started = time.perf_counter()
+        expected = two_pass(page)
+        old_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        actual = html_to_markdown(page)
+        new_seconds = time.perf_counter() - started
+        print(f"{path}: {len(page) / 1e6:.2f} MB, two-pass {old_seconds:.2f}s, "
+              f"single-pass {new_seconds:.2f}s, identical={expected == actual}")
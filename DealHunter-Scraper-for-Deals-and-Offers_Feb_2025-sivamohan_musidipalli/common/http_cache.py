@@ -0,0 +1,240 @@
+# http_cache.py
+# Persistent HTTP response cache with conditional GET revalidation.
+#
+# Responses that carry an ETag or Last-Modified header are stored on disk
+# (SQLite) keyed by URL. The next request for that URL sends If-None-Match /
+# If-Modified-Since, and a 304 reply is answered from the stored body. The
+# store is size-bounded and evicts least-recently-used entries first.
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from common.http_client import get_http_client
+
+DEFAULT_CACHE_DIR = Path(
+    os.getenv("HTTP_CACHE_DIR", Path(__file__).resolve().parents[1] / ".http_cache")
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+# The stored body is already decoded, so these no longer describe it
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+class HttpCache:
+    """On-disk, size-bounded LRU cache of GET responses, revalidated with conditional requests."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.cache_dir / "responses.sqlite"),
+            timeout=30,
+            check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)"
+            )
+
+    # -------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------
+    def get(self, url, client=None, headers=None, **kwargs):
+        """
+        GET `url` through `client` (default: the shared HttpClient), revalidating
+        any stored copy. Returns a requests.Response; `response.from_cache` is
+        True when the body came from disk after a 304.
+        """
+        getter = client or get_http_client()
+        entry = self._lookup(url)
+        request_headers = self._conditional_headers(entry, headers)
+        response = getter.get(url, headers=request_headers, **kwargs)
+
+        if response.status_code == 304 and entry:
+            self._touch(url, response.headers)
+            return self._build_response(url, entry, response)
+
+        response.from_cache = False
+        if response.status_code == 200:
+            self._store(url, response)
+        return response
+
+    def stream(self, url, client=None, headers=None, chunk_size=64 * 1024, **kwargs):
+        """
+        Like get(), but returns (response, chunks) where `chunks` yields the body
+        bytes as they arrive. A 304 replays the stored body; a cacheable 200 is
+        stored once `chunks` has been read to the end.
+        """
+        getter = client or get_http_client()
+        entry = self._lookup(url)
+        request_headers = self._conditional_headers(entry, headers)
+        response = getter.get(url, headers=request_headers, stream=True, **kwargs)
+
+        if response.status_code == 304 and entry:
+            response.close()
+            self._touch(url, response.headers)
+            cached = self._build_response(url, entry, response)
+            return cached, cached.iter_content(chunk_size)
+
+        response.from_cache = False
+
+        def chunks():
+            keep = response.status_code == 200 and self._cacheable(response)
+            body = []
+            for chunk in response.iter_content(chunk_size):
+                if keep:
+                    body.append(chunk)
+                yield chunk
+            if keep:
+                self._store(url, response, b"".join(body))
+
+        return response, chunks()
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes}
+
+    # -------------------------------------------------------------------
+    # Storage helpers
+    # -------------------------------------------------------------------
+    @staticmethod
+    def _conditional_headers(entry, headers):
+        request_headers = dict(headers or {})
+        if entry:
+            if entry["etag"]:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+        return request_headers
+
+    def _lookup(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, headers, body FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "headers": json.loads(row[2]),
+            "body": row[3],
+        }
+
+    @staticmethod
+    def _cacheable(response):
+        # Without a validator there is nothing to revalidate against
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        has_validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        return bool(has_validator) and "no-store" not in cache_control
+
+    def _store(self, url, response, body=None):
+        if not self._cacheable(response):
+            return
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        body = response.content if body is None else body
+        stored_headers = {
+            k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS
+        }
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(stored_headers),
+                 sqlite3.Binary(body), len(body), time.time())
+            )
+            self._evict()
+
+    def _touch(self, url, headers):
+        # A 304 may carry refreshed validators
+        with self._lock, self._conn:
+            self._conn.execute(
+                """UPDATE responses SET last_access = ?,
+                       etag = COALESCE(?, etag),
+                       last_modified = COALESCE(?, last_modified)
+                   WHERE url = ?""",
+                (time.time(), headers.get("ETag"), headers.get("Last-Modified"), url)
+            )
+
+    def _evict(self):
+        """Drop least-recently-used entries until the store fits max_bytes. Caller holds the lock."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT url, size FROM responses ORDER BY last_access ASC"
+        ).fetchall()
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total -= size
+
+    @staticmethod
+    def _build_response(url, entry, revalidation):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = url
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = bytes(entry["body"])
+        response._content_consumed = True
+        response.request = revalidation.request
+        response.elapsed = revalidation.elapsed
+        response.from_cache = True
+        return response
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache shared by all scrapers."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HttpCache()
+        return _default_cache
+
+
+def cached_get(url, client=None, **kwargs):
+    """Drop-in replacement for `requests.get(url, ...)` backed by the shared client and disk cache."""
+    return get_cache().get(url, client=client, **kwargs)
+
+
+def cached_stream(url, client=None, **kwargs):
+    """Streaming counterpart of cached_get(); returns (response, byte chunks)."""
+    return get_cache().stream(url, client=client, **kwargs)
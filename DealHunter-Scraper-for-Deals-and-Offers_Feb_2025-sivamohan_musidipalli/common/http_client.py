@@ -0,0 +1,213 @@
+# http_client.py
+#
+# One shared HTTP client for every requests-based scraper: pooled keep-alive
+# connections, gzip/brotli decoding, browser-like default headers, per-host
+# connection limits, consistent timeouts and optional HTTP/2 (through httpx,
+# when it and h2 are installed). Responses are always requests.Response
+# objects so callers and the disk cache don't care which backend served them.
+
+import importlib.util
+import os
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import brotli  # noqa: F401  (urllib3/httpx decode "br" when it is importable)
+    _BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        _BROTLI = True
+    except ImportError:
+        _BROTLI = False
+
+try:
+    import httpx
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# assets.TIMEOUT_SETTINGS is the one place timeouts are set. The task4 apps
+# pass their own assets to configure_http_client(); everything else (week1,
+# week2, the catalog crawl) gets the task4 values as the client's defaults.
+ASSETS_PATH = Path(__file__).resolve().parents[1] / "task4" / "assets.py"
+
+
+def _asset_timeouts():
+    # assets.py is plain constants, so loading it by path has no side effects
+    spec = importlib.util.spec_from_file_location("_timeout_assets", ASSETS_PATH)
+    assets = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(assets)
+    return {key: assets.TIMEOUT_SETTINGS[key] for key in ("connect", "read")}
+
+
+TIMEOUT_SETTINGS = _asset_timeouts()  # seconds
+DEFAULT_PER_HOST = 10    # simultaneous connections to one host
+DEFAULT_MAX_HOSTS = 20   # hosts whose pools are kept alive
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br" if _BROTLI else "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+
+class HttpClient:
+    """Thread-safe pooled HTTP client. Use get_http_client() for the shared instance."""
+
+    def __init__(self, timeout_settings=None, per_host=DEFAULT_PER_HOST,
+                 max_hosts=DEFAULT_MAX_HOSTS, http2=False):
+        settings = dict(TIMEOUT_SETTINGS, **(timeout_settings or {}))
+        self.timeout = (settings["connect"], settings["read"])
+        self.per_host = per_host
+        self.http2 = bool(http2) and HTTP2_AVAILABLE
+
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._requests = 0
+        self._http2_requests = 0
+        self._httpx_new_connections = 0
+
+        self._session = requests.Session()
+        self._session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_hosts, pool_maxsize=per_host)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._httpx = None
+        if self.http2:
+            self._httpx = httpx.Client(
+                http2=True,
+                headers=DEFAULT_HEADERS,
+                timeout=httpx.Timeout(settings["read"], connect=settings["connect"]),
+                limits=httpx.Limits(
+                    max_connections=per_host * max_hosts,
+                    max_keepalive_connections=per_host * max_hosts
+                ),
+                follow_redirects=True
+            )
+
+    # -------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        """GET `url` over a pooled connection. Returns a requests.Response."""
+        with self._host_slot(url):
+            if self._httpx is not None:
+                response = self._get_http2(url, headers, timeout, **kwargs)
+            else:
+                response = self._session.get(
+                    url, headers=headers, timeout=timeout or self.timeout, **kwargs
+                )
+        with self._lock:
+            self._requests += 1
+        return response
+
+    def stats(self):
+        """Connection reuse counters since the client was created."""
+        with self._lock:
+            requests_made = self._requests
+            http2_requests = self._http2_requests
+            new_connections = self._httpx_new_connections
+
+        for adapter in set(self._session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    new_connections += pool.num_connections
+
+        reused = max(0, requests_made - new_connections)
+        return {
+            "requests": requests_made,
+            "new_connections": new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / requests_made, 3) if requests_made else 0.0,
+            "http2_requests": http2_requests,
+        }
+
+    def close(self):
+        self._session.close()
+        if self._httpx is not None:
+            self._httpx.close()
+
+    # -------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._httpx_new_connections += 1
+
+    def _get_http2(self, url, headers, timeout, **kwargs):
+        # httpx reads the body eagerly here; the converted response is marked
+        # consumed below so iter_content() still works for streaming callers
+        kwargs.pop("stream", None)
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        extra = {"timeout": timeout} if timeout is not None else {}
+        raw = self._httpx.get(
+            url, headers=headers, extensions={"trace": self._trace}, **extra, **kwargs
+        )
+        if raw.http_version == "HTTP/2":
+            with self._lock:
+                self._http2_requests += 1
+
+        response = requests.Response()
+        response.status_code = raw.status_code
+        response.reason = raw.reason_phrase
+        response.url = str(raw.url)
+        response.headers = CaseInsensitiveDict(raw.headers.items())
+        response._content = raw.content
+        response._content_consumed = True
+        response.encoding = raw.encoding
+        response.elapsed = raw.elapsed
+        return response
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(http2=os.getenv("HTTP_CLIENT_HTTP2", "0") == "1")
+        return _client
+
+
+def configure_http_client(**kwargs):
+    """Replace the shared client, e.g. configure_http_client(timeout_settings=TIMEOUT_SETTINGS)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        kwargs.setdefault("http2", os.getenv("HTTP_CLIENT_HTTP2", "0") == "1")
+        _client = HttpClient(**kwargs)
+        return _client
+
+
+def body_encoding(response):
+    """Encoding to decode `response` with: its declared charset, else UTF-8."""
+    # requests falls back to ISO-8859-1 for text/* without a charset; scraped pages are UTF-8
+    if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+        return response.encoding
+    return "utf-8"
@@ -0,0 +1,299 @@
+# libraries.py
+# Fetching and parsing helpers for the publiclibraries.com state directories.
+
+import codecs
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+
+import pandas as pd
+
+from common.resilience import resilient_stream
+from common.http_client import body_encoding
+
+LIBRARY_COLUMNS = ["City", "Library", "Address", "Zip", "Phone"]
+
+# TableRowParser reads every <tr> of the first <table> on a state page as
+# the list of its <td> texts
+TABLE_TAG = "table"
+ROW_TAG = "tr"
+CELL_TAG = "td"
+
+# List of states and their corresponding URLs
+STATES = {
+    "Alabama": "https://publiclibraries.com/state/alabama/",
+    "Alaska": "https://publiclibraries.com/state/alaska/",
+    "Arizona": "https://publiclibraries.com/state/arizona/",
+    "Arkansas": "https://publiclibraries.com/state/arkansas/",
+    "California": "https://publiclibraries.com/state/california/",
+    "Colorado": "https://publiclibraries.com/state/colorado/",
+    "Connecticut": "https://publiclibraries.com/state/connecticut/",
+    "Delaware": "https://publiclibraries.com/state/delaware/",
+    "Florida": "https://publiclibraries.com/state/florida/",
+    "Georgia": "https://publiclibraries.com/state/georgia/",
+    "Hawaii": "https://publiclibraries.com/state/hawaii/",
+    "Idaho": "https://publiclibraries.com/state/idaho/",
+    "Illinois": "https://publiclibraries.com/state/illinois/",
+    "Indiana": "https://publiclibraries.com/state/indiana/",
+    "Iowa": "https://publiclibraries.com/state/iowa/",
+    "Kansas": "https://publiclibraries.com/state/kansas/",
+    "Kentucky": "https://publiclibraries.com/state/kentucky/",
+    "Louisiana": "https://publiclibraries.com/state/louisiana/",
+    "Maine": "https://publiclibraries.com/state/maine/",
+    "Maryland": "https://publiclibraries.com/state/maryland/",
+    "Massachusetts": "https://publiclibraries.com/state/massachusetts/",
+    "Michigan": "https://publiclibraries.com/state/michigan/",
+    "Minnesota": "https://publiclibraries.com/state/minnesota/",
+    "Mississippi": "https://publiclibraries.com/state/mississippi/",
+    "Missouri": "https://publiclibraries.com/state/missouri/",
+    "Montana": "https://publiclibraries.com/state/montana/",
+    "Nebraska": "https://publiclibraries.com/state/nebraska/",
+    "Nevada": "https://publiclibraries.com/state/nevada/",
+    "New Hampshire": "https://publiclibraries.com/state/new-hampshire/",
+    "New Jersey": "https://publiclibraries.com/state/new-jersey/",
+    "New Mexico": "https://publiclibraries.com/state/new-mexico/",
+    "New York": "https://publiclibraries.com/state/new-york/",
+    "North Carolina": "https://publiclibraries.com/state/north-carolina/",
+    "North Dakota": "https://publiclibraries.com/state/north-dakota/",
+    "Ohio": "https://publiclibraries.com/state/ohio/",
+    "Oklahoma": "https://publiclibraries.com/state/oklahoma/",
+    "Oregon": "https://publiclibraries.com/state/oregon/",
+    "Pennsylvania": "https://publiclibraries.com/state/pennsylvania/",
+    "Rhode Island": "https://publiclibraries.com/state/rhode-island/",
+    "South Carolina": "https://publiclibraries.com/state/south-carolina/",
+    "South Dakota": "https://publiclibraries.com/state/south-dakota/",
+    "Tennessee": "https://publiclibraries.com/state/tennessee/",
+    "Texas": "https://publiclibraries.com/state/texas/",
+    "Utah": "https://publiclibraries.com/state/utah/",
+    "Vermont": "https://publiclibraries.com/state/vermont/",
+    "Virginia": "https://publiclibraries.com/state/virginia/",
+    "Washington": "https://publiclibraries.com/state/washington/",
+    "West Virginia": "https://publiclibraries.com/state/west-virginia/",
+    "Wisconsin": "https://publiclibraries.com/state/wisconsin/",
+    "Wyoming": "https://publiclibraries.com/state/wyoming/"
+}
+
+ALL_STATES = "All states"
+DEFAULT_MAX_WORKERS = 8
+
+# The first chunk is small so a UI can show rows almost immediately
+FIRST_CHUNK_ROWS = 50
+CHUNK_ROWS = 1000
+
+
+class TableRowParser(HTMLParser):
+    """
+    Event-based parser for the library table. Rows (ROW_TAG) of the first
+    TABLE_TAG are queued in `rows` as soon as their closing tag is fed, as the
+    list of their CELL_TAG texts, each joined like get_text(strip=True).
+    Rows without cells (header rows) are skipped.
+    """
+
+    def __init__(self, table_tag=TABLE_TAG, row_tag=ROW_TAG, cell_tag=CELL_TAG):
+        super().__init__(convert_charrefs=True)
+        self.table_tag = table_tag
+        self.row_tag = row_tag
+        self.cell_tag = cell_tag
+        self.rows = []
+        self.found_table = False
+        self.done = False
+        self._table_depth = 0
+        self._open_rows = []   # cells of each open row
+        self._open_cells = []  # text parts of each open cell
+        self._skip_depth = 0   # inside <script>/<style>
+        self._text = []        # current text node; feed() may split it
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if self.done:
+            return
+        if tag in ("script", "style"):
+            self._skip_depth += 1
+        elif tag == self.table_tag:
+            self.found_table = True
+            self._table_depth += 1
+        elif not self._table_depth:
+            return
+        elif tag == self.row_tag:
+            self._open_rows.append([])
+        elif tag == self.cell_tag and self._open_rows:
+            cell = []
+            self._open_rows[-1].append(cell)
+            self._open_cells.append(cell)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if self.done:
+            return
+        if tag in ("script", "style"):
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif not self._table_depth:
+            return
+        elif tag == self.cell_tag and self._open_cells:
+            self._open_cells.pop()
+        elif tag == self.row_tag and self._open_rows:
+            self._close_row()
+        elif tag == self.table_tag:
+            self._table_depth -= 1
+            if not self._table_depth:
+                while self._open_rows:
+                    self._close_row()
+                self.done = True
+
+    def handle_data(self, data):
+        if self._open_cells and not self._skip_depth:
+            self._text.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def _flush_text(self):
+        if not self._text:
+            return
+        text = "".join(self._text).strip()
+        self._text.clear()
+        if text:
+            # Nested cells also count towards their enclosing cell's text
+            for cell in self._open_cells:
+                cell.append(text)
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        while self._open_rows:
+            self._close_row()
+
+    def _close_row(self):
+        cells = self._open_rows.pop()
+        self._open_cells = [c for c in self._open_cells if not any(c is own for own in cells)]
+        if cells:  # Only keep rows with data (skip header rows)
+            self.rows.append(["".join(cell) for cell in cells])
+
+
+def iter_library_rows(chunks, encoding="utf-8", parser=None):
+    """
+    Yield table rows (lists of cell texts) while byte `chunks` are still
+    arriving. Set `parser` to a TableRowParser to inspect `found_table` afterwards.
+    """
+    parser = parser or TableRowParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        if parser.done:
+            continue  # drain the body so it can still be cached
+        parser.feed(decoder.decode(chunk))
+        yield from parser.rows
+        parser.rows.clear()
+    if not parser.done:
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+        yield from parser.rows
+        parser.rows.clear()
+
+
+def build_frame_in_chunks(rows, on_chunk=None, first_chunk_rows=FIRST_CHUNK_ROWS,
+                          chunk_rows=CHUNK_ROWS):
+    """
+    Collect `rows` into small DataFrames as they arrive and concatenate them at
+    the end. `on_chunk(chunk_df, rows_so_far)` runs after every chunk.
+    """
+    frames = []
+    pending = []
+    total = 0
+    max_cols = 0
+
+    def flush():
+        nonlocal total, max_cols
+        width = max(len(row) for row in pending)
+        max_cols = max(max_cols, width)
+        frame = pd.DataFrame(pending, columns=LIBRARY_COLUMNS[:width])
+        frames.append(frame)
+        total += len(pending)
+        pending.clear()
+        if on_chunk is not None:
+            on_chunk(frame, total)
+
+    for row in rows:
+        pending.append(row)
+        if len(pending) >= (chunk_rows if frames else first_chunk_rows):
+            flush()
+    if pending:
+        flush()
+
+    if not frames:
+        return pd.DataFrame(columns=LIBRARY_COLUMNS)
+    # Define column names dynamically based on max columns
+    return pd.concat(frames, ignore_index=True).reindex(columns=LIBRARY_COLUMNS[:max_cols])
+
+
+def fetch_state_table(state_url, timeout=None, report=None, on_chunk=None):
+    """
+    Stream one state page and return its table, parsing rows while the page
+    downloads. `on_chunk` is passed to build_frame_in_chunks() so callers can
+    show the first rows early. Transient failures are retried; anything that
+    still fails is recorded in `report` and raised.
+    """
+    response, chunks = resilient_stream(
+        state_url, report=report, context="library table", timeout=timeout
+    )
+    parser = TableRowParser()
+    df = build_frame_in_chunks(
+        iter_library_rows(chunks, body_encoding(response), parser), on_chunk=on_chunk
+    )
+    if not parser.found_table:
+        error = ValueError(f"No table found on {state_url}")
+        if report is not None:
+            report.record_failure(state_url, error, context="library table")
+        raise error
+    return df
+
+
+def scrape_all_states(states=None, max_workers=DEFAULT_MAX_WORKERS, report=None):
+    """
+    Fetch every state page concurrently over the shared pooled HTTP client.
+
+    Returns (df, errors): a single DataFrame with a leading `State` column, in the
+    order of `states`, and a dict of state name -> error message for failed pages.
+    Failures are also recorded in `report` when one is given.
+    """
+    states = states or STATES
+    max_workers = max(1, int(max_workers))
+
+    frames = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_state_table, url, report=report): state
+            for state, url in states.items()
+        }
+        for future in as_completed(futures):
+            state = futures[future]
+            try:
+                frames[state] = future.result()
+            except Exception as e:
+                errors[state] = str(e)
+
+    ordered = []
+    for state in states:
+        if state in frames:
+            ordered.append(frames[state].assign(State=state))
+    if not ordered:
+        return pd.DataFrame(columns=["State"] + LIBRARY_COLUMNS), errors
+
+    df = pd.concat(ordered, ignore_index=True)
+    return df[["State"] + [c for c in df.columns if c != "State"]], errors
+
+
+if __name__ == "__main__":
+    # Headless refresh of the full directory, e.g. from a nightly cron job:
+    #   python -m common.libraries --workers 16 --output all_libraries.csv
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch every state's public libraries.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--output", default="all_libraries.csv")
+    args = parser.parse_args()
+
+    df, errors = scrape_all_states(max_workers=args.workers)
+    df.to_csv(args.output, index=False)
+    print(f"Saved {len(df)} libraries to {args.output}")
+    for state, error in errors.items():
+        print(f"Failed {state}: {error}")
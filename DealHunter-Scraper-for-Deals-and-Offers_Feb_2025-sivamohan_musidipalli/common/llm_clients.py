@@ -0,0 +1,110 @@
+# llm_clients.py
+#
+# Process-wide registry of LLM clients and tokenizers.
+#
+# Building an OpenAI/Groq client or a Gemini model for every chunk throws away
+# its HTTP connection pool, so each call pays for a new TLS handshake. Clients
+# are created on first use, keyed by (provider, model, config), and reused by
+# every chunk, thread and Streamlit rerun afterwards (modules outside the app
+# script stay imported across reruns). SDKs are imported only when a client
+# for them is first requested.
+
+import json
+import threading
+
+
+class ClientRegistry:
+    """Lazily built, shared objects keyed by (provider, model, config)."""
+
+    def __init__(self):
+        self._clients = {}
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Return the object stored under `key`, building it with `factory()` the first time."""
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        # Build under a per-key lock so a slow factory only blocks callers of the same key
+        with self._lock:
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._clients:
+                self._clients[key] = factory()
+            return self._clients[key]
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._building.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+_default_registry = ClientRegistry()
+
+
+def get_client_registry():
+    """Return the process-wide client registry."""
+    return _default_registry
+
+
+def _config_key(config):
+    # Generation configs are nested dicts; a canonical JSON string makes them hashable
+    return json.dumps(config, sort_keys=True, default=str) if config else ""
+
+
+def get_openai_client(api_key, base_url=None):
+    """Shared OpenAI client; `base_url` points it at an OpenAI-compatible server (LM Studio)."""
+    def build():
+        from openai import OpenAI
+        return OpenAI(api_key=api_key, base_url=base_url)
+    return _default_registry.get(("openai", base_url, api_key), build)
+
+
+def get_groq_client(api_key):
+    """Shared Groq client."""
+    def build():
+        from groq import Groq
+        return Groq(api_key=api_key)
+    return _default_registry.get(("groq", None, api_key), build)
+
+
+_gemini_lock = threading.Lock()
+_gemini_key = None
+
+
+def _configure_gemini(genai, api_key):
+    # genai.configure() is process-global: only call it when the key differs from the configured one
+    global _gemini_key
+    with _gemini_lock:
+        if _gemini_key != api_key:
+            genai.configure(api_key=api_key)
+            _gemini_key = api_key
+
+
+def get_gemini_model(model, api_key, generation_config=None):
+    """
+    Shared Gemini model for `model` and `generation_config`. genai is
+    reconfigured whenever `api_key` is not the key it was last configured with.
+    """
+    import google.generativeai as genai
+
+    _configure_gemini(genai, api_key)
+    return _default_registry.get(
+        ("gemini", model, api_key, _config_key(generation_config)),
+        lambda: genai.GenerativeModel(model, generation_config=generation_config)
+    )
+
+
+def get_encoder(model, fallback="gpt-4o-mini"):
+    """Shared tiktoken encoder for `model`; models tiktoken doesn't know use `fallback`'s."""
+    def build():
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.encoding_for_model(fallback)
+    return _default_registry.get(("tiktoken", model, fallback), build)
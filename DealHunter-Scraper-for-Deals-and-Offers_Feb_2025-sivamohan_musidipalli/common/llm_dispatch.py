@@ -0,0 +1,141 @@
+# llm_dispatch.py
+#
+# Send a page's chunks to an LLM concurrently.
+#
+# Every provider has a process-wide limit on calls in flight, so one page's
+# chunks, a batch and several app sessions all share the same budget. Each
+# chunk is retried on its own (common.resilience); a chunk that still fails
+# is recorded and skipped while the others keep their results. There is no
+# provider-wide circuit breaker: one page's bad replies must not fail the
+# rest of the page, or other sessions. Results come back in chunk order, and
+# token usage is summed over every attempt that got a completion back,
+# including ones whose reply couldn't be used.
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from common.resilience import RETRY_STATUSES, call_with_retries, is_retryable
+
+# Calls in flight per provider; local models serve one request at a time
+PROVIDER_CONCURRENCY = {
+    "openai": 8,
+    "gemini": 4,
+    "groq": 4,
+    "local": 1,
+}
+DEFAULT_CONCURRENCY = 4
+CHUNK_MAX_ATTEMPTS = 3
+
+# SDK errors that mean "try again later" rather than "this request is wrong"
+_TRANSIENT_ERROR_NAMES = ("Timeout", "Connection", "RateLimit", "ServiceUnavailable",
+                          "ResourceExhausted", "DeadlineExceeded", "InternalServer")
+
+
+class LLMResponseError(ValueError):
+    """A completion came back (and was paid for) but its reply couldn't be used."""
+
+    def __init__(self, message, token_counts):
+        super().__init__(message)
+        self.token_counts = token_counts
+
+
+def provider_for_model(model):
+    """Provider whose concurrency limit applies to `model`."""
+    name = model.lower()
+    if "groq" in name:
+        return "groq"
+    if "gemini" in name:
+        return "gemini"
+    if "gpt" in name or "openai" in name:
+        return "openai"
+    return "local"
+
+
+def is_retryable_llm_error(error):
+    """Network and rate-limit errors, 5xx replies, and replies that weren't valid JSON."""
+    if is_retryable(error) or isinstance(error, (LLMResponseError, json.JSONDecodeError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status in RETRY_STATUSES:
+        return True
+    return any(part in type(error).__name__ for part in _TRANSIENT_ERROR_NAMES)
+
+
+class ProviderSlots:
+    """A bounded semaphore per provider, created on first use."""
+
+    def __init__(self, limits=None):
+        self.limits = dict(PROVIDER_CONCURRENCY if limits is None else limits)
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def limit(self, provider):
+        return self.limits.get(provider, DEFAULT_CONCURRENCY)
+
+    def semaphore(self, provider):
+        with self._lock:
+            if provider not in self._semaphores:
+                self._semaphores[provider] = threading.BoundedSemaphore(self.limit(provider))
+            return self._semaphores[provider]
+
+
+_default_slots = ProviderSlots()
+
+
+def get_provider_slots():
+    """Return the process-wide per-provider limits."""
+    return _default_slots
+
+
+def dispatch_chunks(chunks, call, provider, report=None, max_attempts=CHUNK_MAX_ATTEMPTS):
+    """
+    Run `call(chunk) -> (result, token_counts)` for every chunk, up to the
+    provider's limit at a time. `call` raises LLMResponseError, carrying the
+    usage, when a completion arrived but can't be used.
+    Returns (results, token_counts): results[i] belongs to chunks[i] and is
+    None if that chunk failed every attempt (the failure is in `report`);
+    token_counts sums every attempt that got a completion.
+    """
+    slots = get_provider_slots()
+    semaphore = slots.semaphore(provider)
+    endpoint = f"llm://{provider}"
+
+    def run(index, chunk):
+        spent = []
+
+        def attempt():
+            with semaphore:
+                try:
+                    result, token_counts = call(chunk)
+                except LLMResponseError as error:
+                    spent.append(error.token_counts)
+                    raise
+            spent.append(token_counts)
+            return result
+
+        try:
+            result = call_with_retries(
+                endpoint, attempt, report=report, max_attempts=max_attempts,
+                context=f"chunk {index + 1} of {len(chunks)}",
+                retry_if=is_retryable_llm_error, breaker_if=None
+            )
+        except Exception as error:
+            print(f"Chunk {index + 1} of {len(chunks)} failed after retries: {error}")
+            result = None
+        return result, spent
+
+    total_tokens = {"input_tokens": 0, "output_tokens": 0}
+    if not chunks:
+        return [], total_tokens
+
+    with ThreadPoolExecutor(max_workers=min(len(chunks), slots.limit(provider))) as executor:
+        outcomes = list(executor.map(run, range(len(chunks)), chunks))
+
+    results = []
+    for result, spent in outcomes:
+        results.append(result)
+        for token_counts in spent:
+            total_tokens["input_tokens"] += token_counts.get("input_tokens", 0)
+            total_tokens["output_tokens"] += token_counts.get("output_tokens", 0)
+    return results, total_tokens
@@ -0,0 +1,127 @@
+# markdown_compaction.py
+#
+# Shrink html2text Markdown before it is sent to an LLM, without losing
+# anything a listing could need:
+#
+# - every link/image URL becomes a short reference ("ref:7"); the model copies
+#   the reference into its output and restore_urls() puts the URL back
+# - decorative images (icons, logos, spacers, tracking pixels, data: URIs) are
+#   dropped; images without alt text are kept, product cards often have none
+# - runs of spaces and blank lines are collapsed
+# - a line is dropped when it repeats the line before it, or when it is made of
+#   links/images only and already appeared (repeated nav menus, "share" rows)
+
+import re
+
+URL_REF_PREFIX = "ref:"
+
+# ![alt](url "title") and [text](url "title"); the URL itself never holds spaces
+_IMAGE = re.compile(r'!\[([^\]]*)\]\(\s*<?([^)\s>]+)>?(?:\s+"[^"]*")?\s*\)([ \t]*)')
+_LINK_TARGET = re.compile(r'\]\(\s*<?([^)\s>]+)>?(?:\s+"[^"]*")?\s*\)')
+_AUTOLINK = re.compile(r"<((?:https?:)?//[^>\s]+)>")
+_REF = re.compile(re.escape(URL_REF_PREFIX) + r"(\d+)")
+
+_DECORATIVE_ALT = re.compile(r"^(?:icon|logo|spacer|pixel|arrow|star|rating|badge|banner)s?$", re.IGNORECASE)
+# Whole path segments or file names only: "google-pixel-8.jpg" and "sprite-2l.jpg" are products
+_DECORATIVE_URL = re.compile(
+    r"^data:|\.svg(?:[?#]|$)"
+    r"|/(?:pixel|spacer|sprites?|tracking|1x1)(?:\.(?:gif|png|jpe?g|webp))?(?:[/?#]|$)",
+    re.IGNORECASE
+)
+
+_SPACES = re.compile(r"[ \t ]{2,}")
+_BLANK_RUN = re.compile(r"\n{3,}")
+# What is left of a line once its links and images are taken out
+_LINK_ONLY_REST = re.compile(r"^[\s|*\-•·,/]*$")
+_ANY_LINK = re.compile(r"!?\[[^\]]*\]\([^)]*\)")
+
+
+class UrlTable:
+    """Bidirectional URL <-> short reference map for one page."""
+
+    def __init__(self):
+        self.urls = []
+        self._ids = {}
+
+    def shorten(self, url):
+        ref = self._ids.get(url)
+        if ref is None:
+            self.urls.append(url)
+            ref = self._ids[url] = f"{URL_REF_PREFIX}{len(self.urls)}"
+        return ref
+
+    def expand(self, text):
+        def replace(match):
+            index = int(match.group(1)) - 1
+            return self.urls[index] if 0 <= index < len(self.urls) else match.group(0)
+        return _REF.sub(replace, text)
+
+    def __len__(self):
+        return len(self.urls)
+
+
+def _is_decorative(alt, url):
+    return bool(_DECORATIVE_ALT.match(alt.strip()) or _DECORATIVE_URL.search(url))
+
+
+def compact_markdown(markdown):
+    """
+    Compact `markdown` for an LLM prompt.
+    Returns (compacted, url_table, stats); pass url_table to restore_urls().
+    """
+    table = UrlTable()
+    stats = {"images_dropped": 0, "lines_dropped": 0}
+
+    def image(match):
+        alt, url = match.group(1), match.group(2)
+        if _is_decorative(alt, url):
+            stats["images_dropped"] += 1
+            return ""
+        return f"![{alt.strip()}]({table.shorten(url)}){match.group(3)}"
+
+    def link(match):
+        url = match.group(1)
+        if url.startswith(URL_REF_PREFIX):
+            return match.group(0)  # an image shortened above
+        return f"]({table.shorten(url)})"
+
+    text = _IMAGE.sub(image, markdown)
+    text = _LINK_TARGET.sub(link, text)
+    text = _AUTOLINK.sub(lambda m: f"<{table.shorten(m.group(1))}>", text)
+
+    lines = []
+    previous = None
+    seen_link_lines = set()
+    for line in text.splitlines():
+        # Leading spaces nest lists; only the ones after the indent are collapsed
+        stripped = line.lstrip()
+        line = line[:len(line) - len(stripped)] + _SPACES.sub(" ", stripped).rstrip()
+        key = line.strip()
+        if not key:
+            lines.append("")
+            continue
+        if key == previous:
+            stats["lines_dropped"] += 1
+            continue
+        if _ANY_LINK.search(key) and _LINK_ONLY_REST.match(_ANY_LINK.sub("", key)):
+            if key in seen_link_lines:
+                stats["lines_dropped"] += 1
+                continue
+            seen_link_lines.add(key)
+        lines.append(line)
+        previous = key
+
+    compacted = _BLANK_RUN.sub("\n\n", "\n".join(lines)).strip() + "\n"
+    stats["urls_shortened"] = len(table)
+    return compacted, table, stats
+
+
+def restore_urls(data, url_table):
+    """Replace short references in every string of `data` (dicts/lists nest) with their URLs."""
+    if isinstance(data, str):
+        return url_table.expand(data)
+    if isinstance(data, dict):
+        return {key: restore_urls(value, url_table) for key, value in data.items()}
+    if isinstance(data, list):
+        return [restore_urls(value, url_table) for value in data]
+    return data
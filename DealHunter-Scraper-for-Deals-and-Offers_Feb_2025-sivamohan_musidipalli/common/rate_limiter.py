@@ -0,0 +1,73 @@
+# rate_limiter.py
+# Thread-safe token-bucket rate limiting, one bucket per host.
+
+import threading
+import time
+from urllib.parse import urlparse
+
+DEFAULT_RATE = 2.0   # requests per second
+DEFAULT_BURST = 3    # requests allowed back-to-back
+
+
+class TokenBucket:
+    """Classic token bucket: refills at `rate` tokens/sec up to `burst` tokens."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self._lock = threading.Lock()
+        self._tokens = float(max(1, int(burst)))
+        self._updated = time.monotonic()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        with self._lock:
+            self.rate = float(rate)
+            self.burst = max(1, int(burst))
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Keeps a TokenBucket per host so every scraper shares the same politeness budget."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.default_rate = rate
+        self.default_burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.default_rate, self.default_burst)
+            return self._buckets[host]
+
+    def configure(self, host, rate, burst):
+        self.bucket(host).configure(rate, burst)
+
+    def acquire(self, url):
+        self.bucket(urlparse(url).netloc).acquire()
+
+
+_default_limiter = HostRateLimiter()
+
+
+def get_rate_limiter():
+    """Return the process-wide per-host limiter."""
+    return _default_limiter
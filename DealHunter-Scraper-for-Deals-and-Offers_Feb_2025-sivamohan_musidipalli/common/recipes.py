@@ -0,0 +1,323 @@
+# recipes.py
+#
+# Learn-once extraction recipes.
+#
+# The first time a (domain, field set) is scraped through the LLM, the model is
+# also shown a few listings of the page's DOM and asked for CSS selectors:
+#
+#     {"item": "div.product-card",
+#      "fields": {"price": {"selector": "span.price", "attr": null},
+#                 "link":  {"selector": "a.title", "attr": "href"}}}
+#
+# The recipe is applied to the same page and stored only if it agrees with the
+# LLM's own extraction, listing by listing and value by value. Later pages from the domain are extracted locally with
+# BeautifulSoup, no LLM call. Each use is scored by its hit rate (share of
+# fields filled); when it falls well below the rate measured at learning time,
+# the recipe is dropped and the caller goes back to the LLM, which relearns it.
+
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup, NavigableString
+
+from common.content_extraction import find_listings
+
+try:
+    import lxml  # noqa: F401
+    _PARSER = "lxml"
+except ImportError:
+    _PARSER = "html.parser"
+
+DEFAULT_RECIPE_DIR = Path(
+    os.getenv("RECIPE_CACHE_DIR", Path(__file__).resolve().parents[1] / ".recipe_cache")
+)
+
+SAMPLE_ITEMS = 3             # listings shown to the LLM
+MAX_SAMPLE_CHARS = 6000      # cap on the sample's size
+MAX_SAMPLE_TEXT = 80         # longer text nodes are truncated in the sample
+SAMPLE_ATTRS = {"class", "id", "href", "src", "data-src", "srcset", "alt", "title", "itemprop", "content"}
+
+MIN_AGREEMENT = 0.8          # share of the LLM's values the recipe must reproduce
+MIN_ITEM_RATIO = 0.8         # recipe must find at least this share of the LLM's listings
+MIN_VALUE_SIMILARITY = 0.9   # two values match when they are this similar (after _comparable)
+MAX_LABEL_WORDS = 2          # words besides the numbers in a price-like value ("rs", "off")
+HIT_RATE_TOLERANCE = 0.8     # drop the recipe below this share of its learned hit rate
+
+_NOT_WORD = re.compile(r"[\W_]+")
+_NUMBER = re.compile(r"\d+")
+
+
+# -------------------------------------------------------------------
+# Building, applying and checking recipes
+# -------------------------------------------------------------------
+def recipe_key(url, fields):
+    """(domain, field set) a recipe is stored under; field order doesn't matter."""
+    domain = urlparse(url).netloc.lower()
+    if domain.startswith("www."):
+        domain = domain[4:]
+    return domain, json.dumps(sorted(fields))
+
+
+def _slim(tag):
+    """Copy of `tag` with only selector-relevant attributes and short text."""
+    tag = copy.copy(tag)
+    for node in [tag] + tag.find_all(True):
+        node.attrs = {name: value for name, value in node.attrs.items() if name in SAMPLE_ATTRS}
+    for text in tag.find_all(string=True):
+        if isinstance(text, NavigableString) and len(text) > MAX_SAMPLE_TEXT:
+            text.replace_with(text[:MAX_SAMPLE_TEXT] + "…")
+    return tag
+
+
+def _path(tag):
+    parts = []
+    for node in [tag] + list(tag.parents):
+        if node.name in (None, "[document]", "html"):
+            break
+        part = node.name
+        if node.get("id"):
+            part += f"#{node['id']}"
+        part += "".join(f".{cls}" for cls in node.get("class") or ())
+        parts.append(part)
+    return " > ".join(reversed(parts))
+
+
+def recipe_sample(html_content, max_items=SAMPLE_ITEMS, max_chars=MAX_SAMPLE_CHARS):
+    """
+    A small piece of the page for the LLM to write selectors against: the first
+    few listings of the largest listing region plus its path in the document.
+    """
+    listings = find_listings(html_content)
+    if listings:
+        region, items = listings[0]
+        body = "\n".join(str(_slim(item)) for item in items[:max_items])
+        sample = f"<!-- listing container: {_path(region)} -->\n{body}"
+    else:
+        soup = BeautifulSoup(html_content, _PARSER)
+        sample = str(_slim(soup.body or soup))
+    return sample[:max_chars]
+
+
+def apply_recipe(html_content, recipe):
+    """
+    Extract listings from `html_content` with `recipe`; items where no field
+    is filled (ad slots, placeholders) are skipped.
+    Returns (listings, hit_rate); hit_rate is the share of fields that were filled.
+    """
+    soup = BeautifulSoup(html_content, _PARSER)
+    try:
+        items = soup.select(recipe["item"])
+    except Exception:
+        return [], 0.0  # a selector the LLM made up may not even parse
+
+    listings = []
+    filled = 0
+    for item in items:
+        listing = {}
+        item_filled = 0
+        for field, rule in recipe["fields"].items():
+            value = ""
+            try:
+                node = item.select_one(rule["selector"]) if rule.get("selector") else item
+            except Exception:
+                node = None
+            if node is not None:
+                if rule.get("attr"):
+                    value = node.get(rule["attr"]) or ""
+                    if isinstance(value, list):
+                        value = " ".join(value)
+                else:
+                    value = node.get_text(" ", strip=True)
+            listing[field] = value
+            item_filled += bool(value)
+        if item_filled:
+            listings.append(listing)
+            filled += item_filled
+
+    cells = len(listings) * len(recipe["fields"])
+    return listings, (filled / cells if cells else 0.0)
+
+
+def _comparable(value):
+    # Case, spacing and punctuation differ between the DOM text and the LLM's copy ("₹1,299" / "1299")
+    return _NOT_WORD.sub(" ", str(value)).strip().lower()
+
+
+def _values_match(expected, found):
+    if not found:
+        return False
+    if expected == found:
+        return True
+    numbers = _NUMBER.findall(expected)
+    if numbers and len(_NUMBER.sub(" ", expected).split()) <= MAX_LABEL_WORDS:
+        # Prices and discounts: the LLM may add or drop a currency sign or label, not a number
+        return numbers == _NUMBER.findall(found)
+    return SequenceMatcher(None, expected, found).ratio() >= MIN_VALUE_SIMILARITY
+
+
+def recipe_agreement(recipe_listings, llm_listings, fields):
+    """
+    Share of the LLM's non-empty values that the recipe extracted for the same
+    listing (matched by position) and the same field.
+    """
+    if len(recipe_listings) < MIN_ITEM_RATIO * len(llm_listings):
+        return 0.0
+    expected = matched = 0
+    for index, llm_listing in enumerate(llm_listings):
+        recipe_listing = recipe_listings[index] if index < len(recipe_listings) else {}
+        for field in fields:
+            value = _comparable(llm_listing.get(field, ""))
+            if not value:
+                continue
+            expected += 1
+            matched += _values_match(value, _comparable(recipe_listing.get(field, "")))
+    return matched / expected if expected else 0.0
+
+
+# -------------------------------------------------------------------
+# Persistent store
+# -------------------------------------------------------------------
+class RecipeStore:
+    """Recipes on disk (SQLite), keyed by (domain, field set)."""
+
+    def __init__(self, cache_dir=DEFAULT_RECIPE_DIR):
+        self.cache_dir = Path(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.cache_dir / "recipes.sqlite"),
+            timeout=30,
+            check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS recipes (
+                    domain TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    recipe TEXT NOT NULL,
+                    learned_hit_rate REAL NOT NULL,
+                    uses INTEGER NOT NULL DEFAULT 0,
+                    learned_at REAL NOT NULL,
+                    PRIMARY KEY (domain, fields)
+                )"""
+            )
+
+    def get(self, url, fields):
+        """Return (recipe, learned_hit_rate) for the URL's domain and `fields`, or (None, None)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT recipe, learned_hit_rate FROM recipes WHERE domain = ? AND fields = ?",
+                recipe_key(url, fields)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def put(self, url, fields, recipe, learned_hit_rate):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recipes (domain, fields, recipe, learned_hit_rate, uses, learned_at)"
+                " VALUES (?, ?, ?, ?, 0, ?)",
+                (*recipe_key(url, fields), json.dumps(recipe), learned_hit_rate, time.time())
+            )
+
+    def record_use(self, url, fields):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE recipes SET uses = uses + 1 WHERE domain = ? AND fields = ?",
+                recipe_key(url, fields)
+            )
+
+    def drop(self, url, fields):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM recipes WHERE domain = ? AND fields = ?", recipe_key(url, fields)
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM recipes")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_recipe_store():
+    """Return the process-wide recipe store."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = RecipeStore()
+        return _default_store
+
+
+# -------------------------------------------------------------------
+# Entry points for the scrapers
+# -------------------------------------------------------------------
+def try_recipe(url, html_content, fields):
+    """
+    Extract `fields` from the page with a stored recipe.
+    Returns (listings, stats); listings is None when the LLM has to be used,
+    either because there is no recipe yet or because its hit rate dropped.
+    """
+    store = get_recipe_store()
+    recipe, learned_hit_rate = store.get(url, fields)
+    if recipe is None:
+        return None, {"recipe": "none"}
+
+    started = time.perf_counter()
+    listings, hit_rate = apply_recipe(html_content, recipe)
+    stats = {
+        "recipe_hit_rate": round(hit_rate, 2),
+        "recipe_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    if not listings or hit_rate < HIT_RATE_TOLERANCE * learned_hit_rate:
+        store.drop(url, fields)
+        stats["recipe"] = "dropped"
+        return None, stats
+    store.record_use(url, fields)
+    stats["recipe"] = "used"
+    return listings, stats
+
+
+def learn_recipe(url, html_content, fields, llm_listings, ask_model):
+    """
+    Ask for a recipe with `ask_model(sample_html, fields) -> (recipe, token_counts)`
+    and store it if it reproduces `llm_listings` from the same page.
+    When a reply was paid for but can't be parsed, `ask_model` raises an error
+    carrying `token_counts` (LLMResponseError) so the spend is still returned.
+    Returns (stats, token_counts).
+    """
+    if not llm_listings:
+        return {"recipe": "not learned"}, {}
+    token_counts = {}
+    try:
+        recipe, token_counts = ask_model(recipe_sample(html_content), fields)
+        if not recipe.get("item") or set(recipe.get("fields", {})) != set(fields):
+            return {"recipe": "rejected"}, token_counts
+        listings, hit_rate = apply_recipe(html_content, recipe)
+    except AttributeError:
+        # Valid JSON that isn't a recipe object (a list, or rules that aren't objects)
+        return {"recipe": "rejected"}, token_counts
+    except Exception as e:
+        print(f"Recipe request for {url} failed: {e}")
+        return {"recipe": "not learned"}, getattr(e, "token_counts", token_counts)
+
+    agreement = recipe_agreement(listings, llm_listings, fields)
+    stats = {"recipe_agreement": round(agreement, 2), "recipe_hit_rate": round(hit_rate, 2)}
+    if agreement < MIN_AGREEMENT:
+        stats["recipe"] = "rejected"
+        return stats, token_counts
+    get_recipe_store().put(url, fields, recipe, hit_rate)
+    stats["recipe"] = "learned"
+    return stats, token_counts
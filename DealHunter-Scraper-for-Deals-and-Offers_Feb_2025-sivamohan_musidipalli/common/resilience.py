@@ -0,0 +1,358 @@
+# resilience.py
+#
+# Shared retry / backoff / circuit-breaker layer for every scraper.
+#
+# - Transient failures (connection errors, 5xx, 429) are retried with
+#   exponential backoff plus full jitter; a Retry-After header on 429/503
+#   overrides the computed delay.
+# - Each host has a circuit breaker: after repeated failed calls it opens and
+#   requests to that host fail fast until a cool-down has passed, then one
+#   trial call is let through (half-open). A call counts once, however many
+#   attempts it made, and only when it failed for a reason that says something
+#   about the host (transport errors, 5xx, 429); a 404 doesn't.
+# - Every failure and retry lands in a RunReport, so a run ends with a
+#   structured list of what went wrong instead of scattered st.error calls.
+
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+from common.http_cache import cached_get, cached_stream
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Navigation errors from these browser drivers (timeouts, resets, crashes) are transient
+BROWSER_ERROR_MODULES = ("playwright", "selenium")
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 0.5   # seconds
+DEFAULT_MAX_DELAY = 30.0   # seconds
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN = 60.0    # seconds
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching the network while a host's breaker is open."""
+
+
+class RetryableStatus(Exception):
+    """An HTTP status worth retrying; carries the response for Retry-After."""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code} for {response.url}")
+        self.response = response
+
+
+# -------------------------------------------------------------------
+# Backoff helpers
+# -------------------------------------------------------------------
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """Exponential backoff with full jitter for the given 1-based attempt."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+def _retry_delay(error, attempt, base_delay, max_delay):
+    if isinstance(error, RetryableStatus) and error.response.status_code in (429, 503):
+        retry_after = parse_retry_after(error.response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, max_delay)
+    return backoff_delay(attempt, base_delay, max_delay)
+
+
+def is_retryable(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, RetryableStatus):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    if type(error).__module__.split(".")[0] in BROWSER_ERROR_MODULES:
+        return True
+    # Not OSError: every requests exception is one, including MissingSchema,
+    # InvalidURL and TooManyRedirects, which no retry will fix
+    return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                              requests.exceptions.ChunkedEncodingError, asyncio.TimeoutError,
+                              ConnectionError, TimeoutError))
+
+
+# -------------------------------------------------------------------
+# Circuit breaker
+# -------------------------------------------------------------------
+class CircuitBreaker:
+    """Per-host closed / open / half-open breaker."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+        self._trial_in_flight = set()
+
+    def before_request(self, host):
+        """
+        Raise CircuitOpenError if `host` is paused; otherwise allow the request.
+        Returns True when the request is the half-open trial.
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return False
+            if time.monotonic() - opened_at < self.cooldown or host in self._trial_in_flight:
+                remaining = max(0.0, self.cooldown - (time.monotonic() - opened_at))
+                raise CircuitOpenError(f"{host} paused after repeated failures ({remaining:.0f}s left)")
+            # Half-open: let exactly one trial request through
+            self._trial_in_flight.add(host)
+            return True
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trial_in_flight.discard(host)
+
+    def record_failure(self, host):
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if host in self._trial_in_flight or self._failures[host] >= self.failure_threshold:
+                self._opened_at[host] = time.monotonic()
+            self._trial_in_flight.discard(host)
+
+    def release(self, host):
+        """End a call that neither proves nor disproves the host is healthy (e.g. a 404)."""
+        with self._lock:
+            self._trial_in_flight.discard(host)
+
+    def state(self, host):
+        with self._lock:
+            if host not in self._opened_at:
+                return "closed"
+            if time.monotonic() - self._opened_at[host] >= self.cooldown:
+                return "half-open"
+            return "open"
+
+
+_breaker = CircuitBreaker()
+
+
+def get_circuit_breaker():
+    return _breaker
+
+
+# -------------------------------------------------------------------
+# Run report
+# -------------------------------------------------------------------
+class RunReport:
+    """Thread-safe record of retries and failures during one scraping run."""
+
+    def __init__(self, name=""):
+        self.name = name
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+        self.failures = []
+        self.retries = 0
+        self.successes = 0
+
+    def record_failure(self, url, error, attempts=1, context=None):
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        with self._lock:
+            self.failures.append({
+                "url": url,
+                "host": urlparse(url).netloc,
+                "error_type": type(error).__name__,
+                "error": str(error),
+                "status": status,
+                "attempts": attempts,
+                "context": context or "",
+                "time": datetime.now().strftime("%H:%M:%S"),
+            })
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+
+    def summary(self):
+        with self._lock:
+            return {
+                "run": self.name,
+                "started": self.started.strftime("%Y-%m-%d %H:%M:%S"),
+                "successes": self.successes,
+                "retries": self.retries,
+                "failures": len(self.failures),
+            }
+
+    def as_records(self):
+        with self._lock:
+            return list(self.failures)
+
+
+# -------------------------------------------------------------------
+# Retrying calls
+# -------------------------------------------------------------------
+def _record_final_failure(breaker, host, error, breaker_if):
+    """Count a call that failed for good toward `host`'s breaker, at most once."""
+    if breaker is None or isinstance(error, CircuitOpenError):
+        return
+    if breaker_if(error):
+        breaker.record_failure(host)
+    else:
+        breaker.release(host)
+
+
+def _release_trial(breaker, host, trial):
+    # A cancelled or interrupted call says nothing about the host, but its
+    # half-open trial slot must be freed or the host stays paused for good
+    if breaker is not None and trial:
+        breaker.release(host)
+
+
+def call_with_retries(url, func, report=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                      base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, context=None,
+                      retry_if=is_retryable, breaker_if=is_retryable):
+    """
+    Run `func()` (which talks to `url`'s host) with a breaker check and retries.
+    `retry_if(error)` decides which errors are worth another attempt;
+    `breaker_if(error)` decides whether a call that still failed counts toward
+    the host's breaker (None leaves the breaker out entirely).
+    Records the final failure in `report` and re-raises it.
+    """
+    host = urlparse(url).netloc
+    breaker = get_circuit_breaker() if breaker_if is not None else None
+    trial = False
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if breaker is not None and attempt == 1:
+                trial = breaker.before_request(host)
+            result = func()
+        except Exception as error:
+            if attempt < max_attempts and retry_if(error):
+                if report is not None:
+                    report.record_retry()
+                try:
+                    time.sleep(_retry_delay(error, attempt, base_delay, max_delay))
+                except BaseException:
+                    _release_trial(breaker, host, trial)
+                    raise
+                continue
+            _record_final_failure(breaker, host, error, breaker_if)
+            if report is not None:
+                report.record_failure(url, error, attempt, context)
+            raise
+        except BaseException:
+            _release_trial(breaker, host, trial)
+            raise
+        if breaker is not None:
+            breaker.record_success(host)
+        if report is not None:
+            report.record_success()
+        return result
+
+
+async def call_with_retries_async(url, coro_factory, report=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                                  base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                                  context=None):
+    """Async twin of call_with_retries; `coro_factory()` must build a fresh coroutine per attempt."""
+    host = urlparse(url).netloc
+    breaker = get_circuit_breaker()
+    trial = False
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if attempt == 1:
+                trial = breaker.before_request(host)
+            result = await coro_factory()
+        except Exception as error:
+            if attempt < max_attempts and is_retryable(error):
+                if report is not None:
+                    report.record_retry()
+                try:
+                    await asyncio.sleep(_retry_delay(error, attempt, base_delay, max_delay))
+                except BaseException:
+                    _release_trial(breaker, host, trial)
+                    raise
+                continue
+            _record_final_failure(breaker, host, error, is_retryable)
+            if report is not None:
+                report.record_failure(url, error, attempt, context)
+            raise
+        except BaseException:
+            _release_trial(breaker, host, trial)
+            raise
+        breaker.record_success(host)
+        if report is not None:
+            report.record_success()
+        return result
+
+
+def resilient_get(url, report=None, context=None, before_attempt=None, request_slot=None, **kwargs):
+    """
+    cached_get() with retries, Retry-After handling and the per-host breaker.
+    `before_attempt(url)` runs ahead of every try (e.g. a rate limiter's acquire).
+    `request_slot` (e.g. a semaphore) is held around each request only, not
+    through rate-limit waits or backoff sleeps.
+    Raises requests.HTTPError for non-retryable error statuses.
+    """
+    def attempt():
+        if before_attempt is not None:
+            before_attempt(url)
+        if request_slot is None:
+            response = cached_get(url, **kwargs)
+        else:
+            with request_slot:
+                response = cached_get(url, **kwargs)
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableStatus(response)
+        response.raise_for_status()
+        return response
+
+    return call_with_retries(url, attempt, report=report, context=context)
+
+
+def resilient_stream(url, report=None, context=None, **kwargs):
+    """
+    cached_stream() with the same retry and breaker handling as resilient_get().
+    Only the request itself is retried; returns (response, chunks) once the
+    status is good, and errors while reading `chunks` propagate to the caller.
+    """
+    def attempt():
+        response, chunks = cached_stream(url, **kwargs)
+        if response.status_code in RETRY_STATUSES:
+            response.close()
+            raise RetryableStatus(response)
+        try:
+            response.raise_for_status()
+        except Exception:
+            # The caller never sees this response, so its connection goes back to the pool here
+            response.close()
+            raise
+        return response, chunks
+
+    return call_with_retries(url, attempt, report=report, context=context)
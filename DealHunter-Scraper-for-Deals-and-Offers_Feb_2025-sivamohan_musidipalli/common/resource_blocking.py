@@ -0,0 +1,122 @@
+# resource_blocking.py
+# Decide which sub-resources a headless browser may skip, and count what was saved.
+#
+# We only keep the rendered HTML, so images, fonts, media and ad/analytics
+# scripts are pure overhead. The same policy drives the Playwright request
+# router (task4) and the Chrome DevTools URL blocklist (task4_with_selenium).
+
+from urllib.parse import urlparse
+
+DEFAULT_BLOCKED_TYPES = {"image", "media", "font"}
+
+DEFAULT_BLOCKED_DOMAINS = [
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "facebook.net",
+    "scorecardresearch.com",
+    "hotjar.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "adnxs.com",
+]
+
+# File extensions used to approximate resource types where the browser
+# API only accepts URL patterns (Chrome's Network.setBlockedURLs).
+TYPE_EXTENSIONS = {
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "media": ["mp4", "webm", "ogg", "mp3", "wav", "m4a", "mov"],
+    "stylesheet": ["css"],
+}
+
+# Rough transfer sizes, used when a blocked request never reports its real size
+ESTIMATED_BYTES = {
+    "image": 60_000,
+    "media": 500_000,
+    "font": 40_000,
+    "script": 30_000,
+    "stylesheet": 20_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+
+def _host_matches(host, domains):
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class ResourcePolicy:
+    """
+    Block requests by resource type or by domain. Hosts in `allowed_domains`
+    are never blocked, for sites that need some of their third-party scripts
+    or assets. (With Selenium, an allowlist turns type blocking off entirely:
+    see url_patterns().)
+    """
+
+    def __init__(self, blocked_types=None, blocked_domains=None, allowed_domains=None):
+        self.blocked_types = set(DEFAULT_BLOCKED_TYPES if blocked_types is None else blocked_types)
+        self.blocked_domains = list(DEFAULT_BLOCKED_DOMAINS if blocked_domains is None else blocked_domains)
+        self.allowed_domains = list(allowed_domains or [])
+
+    def block_reason(self, url, resource_type):
+        """Return "type" or "domain" if the request should be blocked, else None."""
+        host = (urlparse(url).hostname or "").lower()
+        if _host_matches(host, self.allowed_domains):
+            return None
+        if resource_type in self.blocked_types:
+            return "type"
+        if _host_matches(host, self.blocked_domains):
+            return "domain"
+        return None
+
+    def url_patterns(self):
+        """
+        Wildcard URL patterns approximating this policy, for Chrome's Network.setBlockedURLs.
+        Wildcards can't say "any host but these", so with `allowed_domains` set no
+        type patterns are emitted and only blocked domains are matched.
+        """
+        patterns = []
+        if not self.allowed_domains:
+            for resource_type in sorted(self.blocked_types):
+                for ext in TYPE_EXTENSIONS.get(resource_type, []):
+                    patterns.append(f"*.{ext}")
+                    patterns.append(f"*.{ext}?*")
+        for domain in self.blocked_domains:
+            if not _host_matches(domain, self.allowed_domains):
+                patterns.append(f"*://{domain}/*")
+                patterns.append(f"*://*.{domain}/*")
+        return patterns
+
+
+class BlockStats:
+    """Per-page counters of blocked and allowed requests."""
+
+    def __init__(self):
+        self.blocked_requests = 0
+        self.allowed_requests = 0
+        self.bytes_saved = 0
+        self.by_reason = {}
+        self.by_type = {}
+
+    def record_blocked(self, resource_type, reason):
+        self.blocked_requests += 1
+        self.bytes_saved += ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+        self.by_type[resource_type] = self.by_type.get(resource_type, 0) + 1
+
+    def record_allowed(self):
+        self.allowed_requests += 1
+
+    def as_dict(self):
+        return {
+            "blocked_requests": self.blocked_requests,
+            "allowed_requests": self.allowed_requests,
+            "bytes_saved": self.bytes_saved,
+            "by_reason": dict(self.by_reason),
+            "by_type": dict(self.by_type),
+        }
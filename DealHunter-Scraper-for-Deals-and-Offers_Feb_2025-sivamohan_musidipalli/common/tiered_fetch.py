@@ -0,0 +1,149 @@
+# tiered_fetch.py
+#
+# Cheap-first page fetching. A plain HTTP GET is tried before any headless
+# browser; the browser is only used when the static HTML looks like it needs
+# JavaScript to render (empty body, too little text) or lacks the markers the
+# caller asked for. Whichever tier worked is remembered per domain on disk:
+# HTTP as soon as a page is usable, the browser only for domain-level signals
+# (not a missing per-request marker) and once the browser fetch succeeded.
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from common.http_cache import DEFAULT_CACHE_DIR, cached_get
+from common.http_client import body_encoding
+
+HTTP_TIER = "http"
+BROWSER_TIER = "browser"
+
+DEFAULT_MIN_TEXT_CHARS = 500
+# Re-probe domains that needed a browser once a day, in case they went static
+BROWSER_TIER_TTL = 24 * 3600
+
+
+def missing_marker(html, required_markers=None):
+    """Return a reason naming the first of `required_markers` not in `html`, or None."""
+    for marker in required_markers or []:
+        if marker and marker not in html:
+            return f"missing marker '{marker}'"
+    return None
+
+
+def content_problem(html, min_text_chars=DEFAULT_MIN_TEXT_CHARS):
+    """
+    Return a short reason why `html` looks JS-rendered, or None if it can be
+    used as-is. These are signals about the site, unlike missing_marker().
+    """
+    if not html or not html.strip():
+        return "empty response"
+
+    soup = BeautifulSoup(html, "html.parser")
+    body = soup.body or soup
+    for element in body.find_all(["script", "style", "noscript", "template"]):
+        element.decompose()
+    text = " ".join(body.get_text(" ", strip=True).split())
+    if not text:
+        return "empty body"
+    if len(text) < min_text_chars:
+        return f"only {len(text)} characters of text"
+    return None
+
+
+class TierMemory:
+    """Small JSON file mapping domain -> tier that last produced usable HTML."""
+
+    def __init__(self, path=DEFAULT_CACHE_DIR / "fetch_tiers.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        # Domains whose static HTML looked JS-rendered, until a browser fetch confirms it
+        self._suspected = set()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._tiers = json.load(f)
+        except (OSError, ValueError):
+            self._tiers = {}
+
+    def get(self, domain):
+        with self._lock:
+            entry = self._tiers.get(domain)
+        if not entry:
+            return None
+        if entry["tier"] == BROWSER_TIER and time.time() - entry["updated"] > BROWSER_TIER_TTL:
+            return None
+        return entry["tier"]
+
+    def remember(self, domain, tier):
+        with self._lock:
+            # Browser entries are re-stamped so the TTL counts from the latest probe
+            if tier == HTTP_TIER and self._tiers.get(domain, {}).get("tier") == tier:
+                return
+            self._tiers[domain] = {"tier": tier, "updated": time.time()}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._tiers, f, indent=2)
+
+    def suspect_browser(self, domain):
+        with self._lock:
+            self._suspected.add(domain)
+
+    def confirm_browser(self, domain):
+        """Remember the browser tier for `domain` if its static HTML looked JS-rendered."""
+        with self._lock:
+            if domain not in self._suspected:
+                return
+            self._suspected.discard(domain)
+        self.remember(domain, BROWSER_TIER)
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_tier_memory():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TierMemory()
+        return _memory
+
+
+def try_http_tier(url, min_text_chars=DEFAULT_MIN_TEXT_CHARS, required_markers=None, timeout=15):
+    """
+    Attempt the plain-HTTP tier. Returns (html, reason): html is None when the
+    caller should escalate to a browser, with `reason` explaining why.
+    """
+    memory = get_tier_memory()
+    domain = urlparse(url).netloc
+    if memory.get(domain) == BROWSER_TIER:
+        return None, "domain needs a browser"
+
+    try:
+        response = cached_get(url, timeout=timeout)
+        response.raise_for_status()
+        html = response.content.decode(body_encoding(response), errors="replace")
+    except Exception as e:
+        return None, f"HTTP fetch failed: {e}"
+
+    reason = content_problem(html, min_text_chars)
+    if reason:
+        memory.suspect_browser(domain)
+        return None, reason
+    reason = missing_marker(html, required_markers)
+    if reason:
+        # The markers belong to this request; the domain itself serves usable HTML
+        return None, reason
+    memory.remember(domain, HTTP_TIER)
+    return html, None
+
+
+def browser_tier_worked(url):
+    """
+    Call after a browser fetch of `url` succeeded: if the plain-HTTP tier had
+    found the page JS-rendered, the domain goes straight to the browser for a day.
+    """
+    get_tier_memory().confirm_browser(urlparse(url).netloc)
@@ -11,17 +11,27 @@ import json
 from datetime import datetime
 
 from scraper import (
-    fetch_html_playwright,
+    fetch_html_tiered,
     save_raw_data,
     format_data,
     save_formatted_data,
     calculate_price,
-    html_to_markdown_with_readability,
+    html_to_markdown_with_listings,
+    html_to_markdown_with_extraction,
+    compact_markdown_for_model,
+    chunk_markdown,
+    ask_model_for_recipe,
     create_dynamic_listing_model,
     create_listings_container_model
 )
 from assets import PRICING
 import chunk_processor
+from batch_pipeline import run_batch_pipeline, read_url_list
+from common.resilience import RunReport  # importable once scraper has set up sys.path
+from common.markdown_compaction import restore_urls
+from common.chunking import strip_listing_markers
+from common.recipes import try_recipe, learn_recipe
+from common.llm_dispatch import dispatch_chunks, provider_for_model
 
 # ---------------------
 # JSON Fix Helpers
@@ -44,20 +54,6 @@ def best_effort_json_fix(broken_json_str: str):
     except json.JSONDecodeError:
         return None
 
-# ---------------------
-# Process in Overlapping Chunks
-# ---------------------
-def process_in_chunks(content: str, chunk_size: int = 3000, overlap: int = 300):
-    chunks = []
-    start = 0
-    length = len(content)
-    while start < length:
-        end = min(length, start + chunk_size)
-        chunk = content[start:end]
-        chunks.append(chunk)
-        start += (chunk_size - overlap)
-    return chunks
-
 # ---------------------
 # Streamlit App
 # ---------------------
@@ -66,21 +62,41 @@ st.title("Universal Web Scraper 🌏")
 
 st.sidebar.title("Web Scraper ⚙️")
 model_selection = st.sidebar.selectbox("Select Model", options=list(PRICING.keys()), index=0)
-url_input = st.sidebar.text_input("Enter URL")
-
-chunk_size = st.sidebar.slider(
-    "Chunk Size",
-    min_value=1000,
-    max_value=20000,
-    value=3000,  # smaller default
-    step=500
+scrape_mode = st.sidebar.radio("Mode", ["Single URL", "Batch"], horizontal=True)
+if scrape_mode == "Single URL":
+    url_input = st.sidebar.text_input("Enter URL")
+else:
+    url_text = st.sidebar.text_area("Enter URLs (one per line)")
+    url_file = st.sidebar.file_uploader("...or upload a URL list", type=["txt", "csv"])
+    with st.sidebar.expander("Pipeline Concurrency"):
+        fetch_concurrency = st.slider("Parallel fetches", 1, 8, 3)
+        convert_concurrency = st.slider("Parallel conversions", 1, 8, 2)
+        llm_concurrency = st.slider(
+            "Pages at the LLM stage", 1, 16, 4,
+            help="Pages sending chunks at once; LLM calls also share the per-provider limit"
+        )
+required_markers = st.sidebar.text_input(
+    "Required markers (optional)",
+    help="Comma-separated text that must appear in the HTML; otherwise the page is rendered in a browser"
 )
-chunk_overlap = st.sidebar.slider(
-    "Chunk Overlap",
-    min_value=100,
-    max_value=2000,
-    value=300,   # smaller default
-    step=100
+extract_content = st.sidebar.checkbox(
+    "Extract main content",
+    value=True,
+    help="Drop navigation, sidebars, banners and link lists before the page is sent to the model"
+)
+use_recipes = st.sidebar.checkbox(
+    "Reuse learned selectors",
+    value=True,
+    help="After one LLM pass per site and field set, extract later pages with CSS selectors instead of the model"
+)
+
+chunk_tokens = st.sidebar.slider(
+    "Chunk Size (tokens)",
+    min_value=250,
+    max_value=8000,
+    value=1000,
+    step=250,
+    help="Whole listings are packed into each chunk up to this many tokens"
 )
 
 tags = st.sidebar.empty()
@@ -101,50 +117,144 @@ def perform_scrape():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
-    raw_html = loop.run_until_complete(fetch_html_playwright(url_input))
-    markdown = html_to_markdown_with_readability(raw_html)
+    markers = [m.strip() for m in required_markers.split(",") if m.strip()]
+    report = RunReport(url_input)
+    raw_html, load_stats = loop.run_until_complete(fetch_html_tiered(url_input, markers, report))
+    page_stats = {"url": url_input}
+    if extract_content:
+        markdown, content_stats = html_to_markdown_with_extraction(raw_html, model_selection)
+        page_stats.update(content_stats)
+    else:
+        markdown = html_to_markdown_with_listings(raw_html)
+
+    # The model sees the compacted Markdown; the readable one is what we save and offer for download
+    compacted, url_table, compaction_stats = compact_markdown_for_model(markdown, model_selection)
+    page_stats.update(compaction_stats)
+    load_stats["content"] = [page_stats]
+    markdown = strip_listing_markers(markdown)
     save_raw_data(markdown, timestamp)
 
     DynamicListingModel = create_dynamic_listing_model(fields)
     DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
 
-    # Split markdown content into overlapping chunks
-    chunks = process_in_chunks(markdown, chunk_size=chunk_size, overlap=chunk_overlap)
-    combined_listings = []
+    # Split on listing boundaries so no listing is cut in half
+    chunks, chunk_stats = chunk_markdown(compacted, model_selection, chunk_tokens)
+    page_stats.update(chunk_stats)
     total_tokens = {"input_tokens": 0, "output_tokens": 0}
 
-    for chunk in chunks:
-        chunk_result, tokens_count = format_data(
-            chunk,
-            DynamicListingsContainer,
-            DynamicListingModel,
-            model_selection
+    # A recipe learned on an earlier page of this site extracts locally, without the LLM
+    combined_listings, recipe_stats = try_recipe(url_input, raw_html, fields) if use_recipes else (None, {})
+    page_stats.update(recipe_stats)
+
+    if combined_listings is None:
+        def extract(chunk):
+            chunk_result, tokens_count = format_data(
+                chunk,
+                DynamicListingsContainer,
+                DynamicListingModel,
+                model_selection
+            )
+            return chunk_result.get("listings", []), tokens_count
+
+        # Chunks go out concurrently (per-provider limit); results come back in chunk order
+        chunk_results, total_tokens = dispatch_chunks(
+            chunks, extract, provider_for_model(model_selection), report=report
         )
-        if "listings" in chunk_result:
-            combined_listings.extend(chunk_result["listings"])
+        page_stats["failed_chunks"] = chunk_results.count(None)
+        combined_listings = []
+        for listings in chunk_results:
+            if listings:
+                combined_listings.extend(restore_urls(listings, url_table))
 
-        total_tokens["input_tokens"] += tokens_count.get("input_tokens", 0)
-        total_tokens["output_tokens"] += tokens_count.get("output_tokens", 0)
+        if use_recipes:
+            recipe_stats, tokens_count = learn_recipe(
+                url_input, raw_html, fields, combined_listings,
+                lambda sample, names: ask_model_for_recipe(sample, names, model_selection)
+            )
+            page_stats.update(recipe_stats)
+            total_tokens["input_tokens"] += tokens_count.get("input_tokens", 0)
+            total_tokens["output_tokens"] += tokens_count.get("output_tokens", 0)
+
+    load_stats["failures"] = report.as_records()
+    load_stats["retries"] = report.retries
 
     combined_data = {"listings": combined_listings}
     in_tokens, out_tokens, total_c = calculate_price(total_tokens, model=model_selection)
     df = save_formatted_data(combined_data, timestamp)
-    return df, combined_data, markdown, in_tokens, out_tokens, total_c, timestamp
+    return df, combined_data, markdown, in_tokens, out_tokens, total_c, timestamp, load_stats
+
+def perform_batch_scrape():
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    urls = read_url_list(url_text or "")
+    if url_file is not None:
+        urls += [u for u in read_url_list(url_file.getvalue().decode("utf-8")) if u not in urls]
+
+    markers = [m.strip() for m in required_markers.split(",") if m.strip()]
+    started = loop.time()
+    report = RunReport(f"Batch of {len(urls)} URLs")
+    batch = loop.run_until_complete(run_batch_pipeline(
+        urls,
+        fields,
+        model_selection,
+        chunk_tokens,
+        fetch_concurrency=fetch_concurrency,
+        convert_concurrency=convert_concurrency,
+        llm_concurrency=llm_concurrency,
+        required_markers=markers,
+        report=report,
+        extract_content=extract_content,
+        use_recipes=use_recipes
+    ))
+
+    markdown = "\n\n".join(f"<!-- Source: {page['url']} -->\n\n{page['markdown']}" for page in batch["pages"])
+    save_raw_data(markdown, timestamp)
+
+    # Summarise page loads across the batch for the sidebar
+    page_stats = [page["load_stats"] for page in batch["pages"]]
+    tiers = [stats.get("tier", "browser") for stats in page_stats]
+    load_stats = {
+        "tier": ", ".join(f"{tier} ×{tiers.count(tier)}" for tier in sorted(set(tiers))),
+        "scrolls": sum(stats.get("scrolls", 0) for stats in page_stats),
+        "seconds": round(loop.time() - started, 2),
+        "blocking": {
+            "blocked_requests": sum(stats.get("blocking", {}).get("blocked_requests", 0) for stats in page_stats),
+            "bytes_saved": sum(stats.get("blocking", {}).get("bytes_saved", 0) for stats in page_stats),
+        },
+        "failures": report.as_records(),
+        "retries": report.retries,
+    }
+    load_stats["content"] = [{"url": page["url"], **page["content"]} for page in batch["pages"]]
+
+    combined_data = {"listings": batch["listings"]}
+    in_tokens, out_tokens, total_c = calculate_price(batch["tokens"], model=model_selection)
+    df = save_formatted_data(combined_data, timestamp)
+    return df, combined_data, markdown, in_tokens, out_tokens, total_c, timestamp, load_stats
 
 if 'perform_scrape' not in st.session_state:
     st.session_state['perform_scrape'] = False
 
 if st.sidebar.button("Scrape"):
     with st.spinner('Please wait... Data is being scraped.'):
-        st.session_state['results'] = perform_scrape()
+        if scrape_mode == "Single URL":
+            st.session_state['results'] = perform_scrape()
+        else:
+            st.session_state['results'] = perform_batch_scrape()
         st.session_state['perform_scrape'] = True
 
 if st.session_state.get('perform_scrape'):
-    df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp = st.session_state['results']
+    df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp, load_stats = st.session_state['results']
 
     # Because of post-processing, we should always have address/phone, even if empty.
     # So "missing field" warnings should not appear now.
 
+    failures = load_stats.get("failures", [])
+    if failures:
+        with st.expander(f"⚠️ {len(failures)} URL(s) failed after {load_stats.get('retries', 0)} retries"):
+            st.dataframe(pd.DataFrame(failures), use_container_width=True)
+
     st.write("Scraped Data:", df)
 
     st.sidebar.markdown("### Token Usage")
@@ -152,6 +262,41 @@ if st.session_state.get('perform_scrape'):
     st.sidebar.markdown(f"**Output Tokens:** {output_tokens}")
     st.sidebar.markdown(f"**Total Cost:** ${total_cost:.4f}")
 
+    st.sidebar.markdown("### Page Load")
+    st.sidebar.markdown(f"**Fetched With:** {load_stats.get('tier', 'browser')}")
+    st.sidebar.markdown(f"**Scrolls:** {load_stats['scrolls']}")
+    st.sidebar.markdown(f"**Load Time:** {load_stats['seconds']}s")
+    blocking = load_stats.get("blocking", {})
+    st.sidebar.markdown(f"**Requests Blocked:** {blocking.get('blocked_requests', 0)}")
+    st.sidebar.markdown(f"**Est. Bandwidth Saved:** {blocking.get('bytes_saved', 0) / 1024:.0f} KB")
+
+    content = load_stats.get("content", [])
+    if content:
+        st.sidebar.markdown("### Page Tokens")
+        if "tokens_before" in content[0]:
+            tokens_before = sum(page["tokens_before"] for page in content)
+            tokens_after = sum(page["tokens_after"] for page in content)
+            saved = 1 - tokens_after / tokens_before if tokens_before else 0
+            st.sidebar.markdown(f"**Content Extraction:** {tokens_before} → {tokens_after} ({saved:.0%} saved)")
+        tokens_before = sum(page["tokens_uncompacted"] for page in content)
+        tokens_after = sum(page["tokens_compacted"] for page in content)
+        saved = 1 - tokens_after / tokens_before if tokens_before else 0
+        st.sidebar.markdown(f"**Compaction:** {tokens_before} → {tokens_after} ({saved:.0%} saved)")
+        split = sum(page.get("split_listings", 0) for page in content)
+        failed = sum(page.get("failed_chunks", 0) for page in content)
+        st.sidebar.markdown(
+            f"**Chunks:** {sum(page.get('chunks', 0) for page in content)} "
+            f"({split} oversized listings split, {failed} failed)"
+        )
+        recipes = [page.get("recipe") for page in content if page.get("recipe")]
+        if recipes:
+            st.sidebar.markdown(
+                f"**Learned Selectors:** {recipes.count('used')} page(s) without the LLM, "
+                f"{recipes.count('learned')} learned, {recipes.count('dropped')} dropped"
+            )
+        with st.expander("Token savings per URL"):
+            st.dataframe(pd.DataFrame(content), use_container_width=True)
+
     col1, col2, col3 = st.columns(3)
     with col1:
         st.download_button(
@@ -188,4 +333,4 @@ if st.session_state.get('perform_scrape'):
             st.text_area("Gemini Responses Table", table_output, height=400)
 
 if 'results' in st.session_state:
-    df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp = st.session_state['results']
+    df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp, load_stats = st.session_state['results']
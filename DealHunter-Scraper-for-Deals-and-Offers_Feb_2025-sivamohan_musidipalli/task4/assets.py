@@ -81,10 +81,27 @@ PRICING = {
 
 # Timeout settings for web scraping
 TIMEOUT_SETTINGS = {
-    "page_load": 30,
-    "script": 10
+    "page_load": 60,  # Playwright page.goto
+    "script": 10,
+    "connect": 5,   # plain HTTP connect timeout
+    "read": 15      # plain HTTP read timeout
 }
 
+# Playwright browser pool settings
+BROWSER_POOL_SIZE = 2        # warm Chromium instances kept running
+MAX_CONCURRENT_PAGES = 4     # pages open at the same time across the pool
+BROWSER_MAX_USES = 50        # fetches before a browser is relaunched
+
+# Adaptive scrolling: stop once the page height, DOM size and network have settled
+SCROLL_SETTINGS = {
+    "quiet_window": 1.0,   # seconds without network activity counted as idle
+    "max_scrolls": 25,     # hard cap on scroll steps
+    "max_seconds": 30,     # hard cap on total scrolling time
+}
+
+# Elements dropped (with everything inside them) before the page becomes Markdown
+MARKDOWN_REMOVED_TAGS = ("header", "footer")
+
 # Other reusable constants or configuration settings
 HEADLESS_OPTIONS = [ "--headless=new","--disable-gpu", "--disable-dev-shm-usage","--window-size=1920,1080","--disable-search-engine-choice-screen"]
 
@@ -96,6 +113,17 @@ SYSTEM_MESSAGE = """You are an intelligent text extraction and conversion assist
                         from the given text and convert it into a pure JSON format. The JSON should contain only the structured data extracted from the text, 
                         with no additional commentary, explanations, or extraneous information. 
                         You could encounter cases where you can't find the data of the fields you have to extract or the data will be in a foreign language.
+                        Links and images in the text are written as short references such as ref:12; when a field holds a URL or image, copy its reference exactly.
                         Please process the following text and provide the output in pure JSON format with no words before or after the JSON:"""
 
-USER_MESSAGE = f"Extract the following information from the provided text:\nPage content:\n\n"
\ No newline at end of file
+USER_MESSAGE = f"Extract the following information from the provided text:\nPage content:\n\n"
+
+# Asking once per site for CSS selectors, so later pages are extracted without the LLM
+RECIPE_SYSTEM_MESSAGE = """You write CSS selectors for web scraping. You are given a few listings from a web page and a list of fields.
+                        Reply with pure JSON of the form
+                        {"item": "<selector matching every listing on the page>",
+                         "fields": {"<field>": {"selector": "<selector relative to the listing>", "attr": "<attribute to read, or null for the text>"}}}
+                        with one entry per field, named exactly as given. Use tag names, classes and attributes that appear in the HTML;
+                        avoid positional selectors such as :nth-child. For links use "href", for images the attribute holding the real URL."""
+
+RECIPE_USER_MESSAGE = "Fields: {fields}\nListings:\n\n"
\ No newline at end of file
@@ -0,0 +1,163 @@
+# batch_pipeline.py
+#
+# Scrape many URLs as a pipeline:
+# fetch -> main content -> markdown -> compaction -> chunks -> format_data.
+# Every URL moves through the stages on its own, and each stage has its own
+# concurrency limit, so one page's LLM calls overlap the next page's fetch.
+# Chunks go through common.llm_dispatch like the single-URL scrape: each is
+# retried on its own, calls share the per-provider limit, and a chunk that
+# still fails is skipped without losing the rest of the page.
+
+import asyncio
+
+from scraper import (
+    fetch_html_tiered,
+    html_to_markdown_with_listings,
+    html_to_markdown_with_extraction,
+    compact_markdown_for_model,
+    chunk_markdown,
+    ask_model_for_recipe,
+    format_data,
+    create_dynamic_listing_model,
+    create_listings_container_model
+)
+from common.markdown_compaction import restore_urls  # importable once scraper has set up sys.path
+from common.chunking import strip_listing_markers
+from common.recipes import recipe_key, try_recipe, learn_recipe
+from common.llm_dispatch import dispatch_chunks, provider_for_model
+
+SOURCE_URL_FIELD = "source_url"
+
+
+def read_url_list(text):
+    """Parse URLs from pasted text or an uploaded file (one per line, or comma separated)."""
+    urls = []
+    for line in text.replace(",", "\n").splitlines():
+        url = line.strip()
+        if url and not url.startswith("#") and url not in urls:
+            urls.append(url)
+    return urls
+
+
+async def run_batch_pipeline(urls, fields, selected_model, chunk_tokens,
+                             fetch_concurrency=3, convert_concurrency=2, llm_concurrency=4,
+                             required_markers=None, report=None, extract_content=True, use_recipes=True):
+    """
+    Run the scrape pipeline over `urls` and merge the results.
+    Pages are split on listing boundaries into chunks of at most `chunk_tokens`.
+    With `extract_content` boilerplate is stripped before conversion. The Markdown
+    is compacted before chunking and URLs are restored in the listings; each page
+    records its token savings and chunk counts (including "failed_chunks")
+    under "content". `llm_concurrency` caps the pages sending chunks at once;
+    the calls themselves share the provider's limit. With `use_recipes`
+    pages of a site with a learned recipe skip the LLM (see common.recipes).
+
+    Returns a dict with the merged "listings" (each tagged with source_url),
+    summed "tokens", per-URL "pages" summaries and any per-URL "errors".
+    Fetch retries and every failed URL are recorded in `report`.
+    """
+    DynamicListingModel = create_dynamic_listing_model(fields)
+    DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
+
+    fetch_slots = asyncio.Semaphore(fetch_concurrency)
+    convert_slots = asyncio.Semaphore(convert_concurrency)
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+
+    provider = provider_for_model(selected_model)
+
+    def extract(chunk):
+        chunk_result, tokens_count = format_data(
+            chunk, DynamicListingsContainer, DynamicListingModel, selected_model
+        )
+        return chunk_result.get("listings", []), tokens_count
+
+    def add_tokens(total, tokens_count):
+        total["input_tokens"] += tokens_count.get("input_tokens", 0)
+        total["output_tokens"] += tokens_count.get("output_tokens", 0)
+
+    recipe_locks = {}
+    unlearnable = set()
+
+    async def llm_listings(chunks, url_table, content_stats):
+        async with llm_slots:
+            chunk_results, tokens = await asyncio.to_thread(dispatch_chunks, chunks, extract, provider, report)
+        content_stats["failed_chunks"] = chunk_results.count(None)
+        listings = []
+        for chunk_listings in chunk_results:
+            if chunk_listings:
+                listings.extend(restore_urls(chunk_listings, url_table))
+        return listings, tokens
+
+    async def extract_listings(url, html, chunks, url_table, content_stats):
+        key = recipe_key(url, fields)
+        if use_recipes and key not in unlearnable:
+            # Pages of one site wait for the first to learn the recipe instead of all paying
+            # for the LLM. If it can't be learned, the waiting pages leave the lock one by
+            # one and run their LLM extraction concurrently.
+            async with recipe_locks.setdefault(key, asyncio.Lock()):
+                listings, recipe_stats = await asyncio.to_thread(try_recipe, url, html, fields)
+                content_stats.update(recipe_stats)
+                if listings is not None:
+                    return listings, {"input_tokens": 0, "output_tokens": 0}
+                if key not in unlearnable:
+                    listings, tokens = await llm_listings(chunks, url_table, content_stats)
+                    async with llm_slots:
+                        recipe_stats, tokens_count = await asyncio.to_thread(
+                            learn_recipe, url, html, fields, listings,
+                            lambda sample, names: ask_model_for_recipe(sample, names, selected_model)
+                        )
+                    content_stats.update(recipe_stats)
+                    add_tokens(tokens, tokens_count)
+                    if recipe_stats["recipe"] != "learned":
+                        unlearnable.add(key)
+                    return listings, tokens
+        return await llm_listings(chunks, url_table, content_stats)
+
+    async def process(url):
+        async with fetch_slots:
+            html, load_stats = await fetch_html_tiered(url, required_markers, report)
+        async with convert_slots:
+            if extract_content:
+                markdown, content_stats = await asyncio.to_thread(
+                    html_to_markdown_with_extraction, html, selected_model
+                )
+            else:
+                markdown = await asyncio.to_thread(html_to_markdown_with_listings, html)
+                content_stats = {}
+            compacted, url_table, compaction_stats = await asyncio.to_thread(
+                compact_markdown_for_model, markdown, selected_model
+            )
+            content_stats.update(compaction_stats)
+            chunks, chunk_stats = await asyncio.to_thread(chunk_markdown, compacted, selected_model, chunk_tokens)
+            content_stats.update(chunk_stats)
+
+        listings, tokens = await extract_listings(url, html, chunks, url_table, content_stats)
+        for listing in listings:
+            listing[SOURCE_URL_FIELD] = url
+
+        return {
+            "url": url,
+            "markdown": strip_listing_markers(markdown),
+            "listings": listings,
+            "tokens": tokens,
+            "load_stats": load_stats,
+            "content": content_stats,
+        }
+
+    results = await asyncio.gather(*(process(url) for url in urls), return_exceptions=True)
+
+    merged = {"listings": [], "tokens": {"input_tokens": 0, "output_tokens": 0},
+              "pages": [], "errors": {}}
+    # gather keeps input order, so the merged listings follow the URL list
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            merged["errors"][url] = str(result)
+            # Fetch failures are already in the report; add the later stages'
+            if report is not None and url not in {f["url"] for f in report.as_records()}:
+                report.record_failure(url, result, context="pipeline")
+            continue
+        merged["listings"].extend(result["listings"])
+        merged["tokens"]["input_tokens"] += result["tokens"]["input_tokens"]
+        merged["tokens"]["output_tokens"] += result["tokens"]["output_tokens"]
+        merged["pages"].append(result)
+    return merged
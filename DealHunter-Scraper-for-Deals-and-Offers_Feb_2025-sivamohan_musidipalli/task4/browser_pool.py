@@ -0,0 +1,186 @@
+# browser_pool.py
+#
+# A long-lived pool of warm Chromium browsers for fetch_html_playwright.
+# Playwright objects are bound to the event loop that created them, while
+# Streamlit builds a fresh loop on every scrape, so the pool owns a private
+# event loop running on a background thread. Callers on any loop simply
+# await `pool.fetch(...)`, which hands the work over to that thread.
+
+import asyncio
+import atexit
+import itertools
+import random
+import threading
+
+from playwright.async_api import async_playwright
+
+from assets import (
+    USER_AGENTS, BROWSER_POOL_SIZE, MAX_CONCURRENT_PAGES, BROWSER_MAX_USES,
+    TIMEOUT_SETTINGS
+)
+
+
+class _BrowserSlot:
+    """One warm browser plus its bookkeeping."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.uses = 0
+        self.active = 0
+
+
+class BrowserPool:
+    """
+    Keeps `size` Chromium browsers running. Every fetch gets a fresh context
+    (with the next user agent in rotation), at most `max_pages` pages are open
+    at once, and each browser is relaunched after `max_uses` fetches.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=MAX_CONCURRENT_PAGES,
+                 max_uses=BROWSER_MAX_USES, headless=True):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_uses = max_uses
+        self.headless = headless
+
+        agents = list(USER_AGENTS)
+        random.shuffle(agents)
+        self._user_agents = itertools.cycle(agents)
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="browser-pool", daemon=True
+        )
+        self._thread.start()
+
+        self._playwright = None
+        self._slots = []
+        self._lock = None
+        self._page_slots = None
+        self._closed = False
+
+        self._run(self._start())
+
+    # -------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------
+    async def fetch(self, url, page_handler, prepare=None):
+        """
+        Open `url` in a fresh context and return `await page_handler(page)`.
+        `prepare(page)`, if given, is awaited before navigation (e.g. to install routes).
+        Safe to await from any event loop.
+        """
+        if self._closed:
+            raise RuntimeError("BrowserPool is closed")
+        future = asyncio.run_coroutine_threadsafe(
+            self._fetch(url, page_handler, prepare), self._loop
+        )
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        """Close every browser and stop the pool's event loop."""
+        if self._closed:
+            return
+        self._closed = True
+        self._run(self._shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+    # -------------------------------------------------------------------
+    # Internals (run on the pool's own loop)
+    # -------------------------------------------------------------------
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _start(self):
+        self._lock = asyncio.Lock()
+        self._page_slots = asyncio.Semaphore(self.max_pages)
+        self._playwright = await async_playwright().start()
+        for _ in range(self.size):
+            self._slots.append(_BrowserSlot(await self._launch()))
+
+    async def _launch(self):
+        return await self._playwright.chromium.launch(headless=self.headless)
+
+    async def _relaunch(self, slot):
+        try:
+            await slot.browser.close()
+        except Exception:
+            pass
+        slot.browser = await self._launch()
+        slot.uses = 0
+
+    async def _acquire(self):
+        async with self._lock:
+            # Prefer browsers that still have uses left, then the least busy one
+            slot = min(
+                self._slots,
+                key=lambda s: (s.uses >= self.max_uses and s.active > 0, s.active)
+            )
+            if not slot.browser.is_connected() or (
+                slot.uses >= self.max_uses and slot.active == 0
+            ):
+                await self._relaunch(slot)
+            slot.uses += 1
+            slot.active += 1
+            return slot
+
+    async def _release(self, slot):
+        async with self._lock:
+            slot.active -= 1
+            if slot.uses >= self.max_uses and slot.active == 0:
+                await self._relaunch(slot)
+
+    async def _fetch(self, url, page_handler, prepare=None):
+        async with self._page_slots:
+            slot = await self._acquire()
+            context = None
+            try:
+                context = await slot.browser.new_context(user_agent=next(self._user_agents))
+                page = await context.new_page()
+                if prepare is not None:
+                    await prepare(page)
+                await page.goto(url, timeout=TIMEOUT_SETTINGS["page_load"] * 1000)
+                return await page_handler(page)
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                await self._release(slot)
+
+    async def _shutdown(self):
+        for slot in self._slots:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+        self._slots = []
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Return the process-wide pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = BrowserPool()
+        return _pool
+
+
+def shutdown_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(shutdown_browser_pool)
@@ -1,10 +1,12 @@
 # chunk_processor.py
 import os
+import sys
+from pathlib import Path
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import google.generativeai as genai
 from tabulate import tabulate
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.llm_clients import get_gemini_model
 
 SYSTEM_MESSAGE = "You are an assistant that summarizes markdown content."
 USER_MESSAGE = "Summarize the following markdown content:"
@@ -16,8 +18,9 @@ def get_text_chunks(markdown_content):
 
 def process_chunk(chunk):
     prompt = f"{SYSTEM_MESSAGE}\n{USER_MESSAGE}\n{chunk}"
-    model_obj = genai.GenerativeModel(
+    model_obj = get_gemini_model(
         'gemini-2.0-flash',
+        os.getenv("GEMINI_API_KEY"),
         generation_config={"response_mime_type": "text/plain"}
     )
     completion = model_obj.generate_content(prompt)
@@ -7,32 +7,37 @@ if sys.platform.startswith('win'):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
 import os
-import random
 import json
 from datetime import datetime
 from typing import List, Type
 from pathlib import Path
 
 import pandas as pd
-from bs4 import BeautifulSoup
 from pydantic import BaseModel, create_model
-import html2text
-import tiktoken
-
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
-
-from openai import OpenAI
-import google.generativeai as genai
-from groq import Groq
 
 from assets import (
-    USER_AGENTS, PRICING, HEADLESS_OPTIONS,
-    SYSTEM_MESSAGE, USER_MESSAGE,
+    PRICING, SCROLL_SETTINGS, TIMEOUT_SETTINGS, MARKDOWN_REMOVED_TAGS,
+    SYSTEM_MESSAGE, USER_MESSAGE, RECIPE_SYSTEM_MESSAGE, RECIPE_USER_MESSAGE,
     LLAMA_MODEL_FULLNAME, GROQ_LLAMA_MODEL_FULLNAME
 )
+from browser_pool import get_browser_pool
+
+# Make the shared helpers in ../common importable when run via `streamlit run`
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.resource_blocking import ResourcePolicy, BlockStats
+from common.tiered_fetch import try_http_tier, browser_tier_worked, HTTP_TIER, BROWSER_TIER
+from common.http_client import configure_http_client
+from common.resilience import call_with_retries_async
+from common.html_markdown import html_to_markdown
+from common.content_extraction import extract_main_content, mark_listing_boundaries
+from common.chunking import chunk_by_listings, strip_listing_markers
+from common.llm_clients import get_openai_client, get_groq_client, get_gemini_model, get_encoder
+from common.llm_dispatch import LLMResponseError
+from common.markdown_compaction import compact_markdown
 
 load_dotenv()
+configure_http_client(timeout_settings=TIMEOUT_SETTINGS)
 
 BASE_DIR = Path(__file__).parent.resolve()
 OUTPUT_DIR = BASE_DIR / "output"
@@ -82,41 +87,193 @@ def postprocess_listings(listings, field_names: List[str]):
     return listings
 
 
-async def fetch_html_playwright(url):
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(user_agent=random.choice(USER_AGENTS))
-        page = await context.new_page()
-        await page.goto(url, timeout=60000)
+async def scroll_until_stable(page, quiet_window=None, max_scrolls=None, max_seconds=None):
+    """
+    Scroll until document height and DOM node count stop changing and the network
+    has been idle for `quiet_window` seconds, bounded by `max_scrolls`/`max_seconds`.
+    Returns {"scrolls": int, "seconds": float, "stable": bool}.
+    """
+    quiet_window = SCROLL_SETTINGS["quiet_window"] if quiet_window is None else quiet_window
+    max_scrolls = SCROLL_SETTINGS["max_scrolls"] if max_scrolls is None else max_scrolls
+    max_seconds = SCROLL_SETTINGS["max_seconds"] if max_seconds is None else max_seconds
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + max_seconds
+
+    # Track in-flight requests to know when the network has gone quiet
+    in_flight = set()
+    last_activity = [loop.time()]
+
+    def on_request(request):
+        in_flight.add(request)
+        last_activity[0] = loop.time()
+
+    def on_request_done(request):
+        in_flight.discard(request)
+        last_activity[0] = loop.time()
+
+    page.on("request", on_request)
+    page.on("requestfinished", on_request_done)
+    page.on("requestfailed", on_request_done)
+
+    async def wait_for_network_idle():
+        while loop.time() < deadline:
+            if not in_flight and loop.time() - last_activity[0] >= quiet_window:
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def snapshot():
+        return await page.evaluate(
+            "[document.body ? document.body.scrollHeight : 0, document.getElementsByTagName('*').length]"
+        )
 
-        # Multiple scroll attempts to load dynamic content
-        for _ in range(5):
+    scrolls = 0
+    stable = False
+    try:
+        await wait_for_network_idle()
+        previous = await snapshot()
+        while scrolls < max_scrolls and loop.time() < deadline:
             await page.evaluate("window.scrollBy(0, document.body.scrollHeight);")
-            await asyncio.sleep(2)  # adjust as needed
+            scrolls += 1
+            idle = await wait_for_network_idle()
+            current = await snapshot()
+            if idle and current == previous:
+                stable = True
+                break
+            previous = current
+    finally:
+        page.remove_listener("request", on_request)
+        page.remove_listener("requestfinished", on_request_done)
+        page.remove_listener("requestfailed", on_request_done)
+
+    return {"scrolls": scrolls, "seconds": round(loop.time() - started, 2), "stable": stable}
+
+
+async def fetch_html_playwright(url, policy=None, report=None):
+    """
+    Fetch fully scrolled page HTML. Requests matching `policy` (default
+    ResourcePolicy()) are aborted. Navigation failures are retried with backoff
+    behind the per-host circuit breaker and recorded in `report`.
+    Returns (html, load_stats).
+    """
+    policy = policy or ResourcePolicy()
+    block_stats = BlockStats()
+
+    async def block_resources(route):
+        request = route.request
+        reason = policy.block_reason(request.url, request.resource_type)
+        if reason:
+            block_stats.record_blocked(request.resource_type, reason)
+            await route.abort()
+        else:
+            block_stats.record_allowed()
+            await route.continue_()
+
+    async def prepare_page(page):
+        await page.route("**/*", block_resources)
+
+    async def load_page(page):
+        # Scroll adaptively until lazy-loaded content stops arriving
+        load_stats = await scroll_until_stable(page)
+        return await page.content(), load_stats
+
+    # Browsers stay warm in the shared pool; each fetch (and retry) gets its own context
+    html, load_stats = await call_with_retries_async(
+        url,
+        lambda: get_browser_pool().fetch(url, load_page, prepare=prepare_page),
+        report=report,
+        context="browser fetch"
+    )
+    load_stats["blocking"] = block_stats.as_dict()
+    print(
+        f"Loaded {url} after {load_stats['scrolls']} scrolls in {load_stats['seconds']}s, "
+        f"blocked {block_stats.blocked_requests} requests (~{block_stats.bytes_saved // 1024} KB)"
+    )
 
-        html = await page.content()
+    # Debug save
+    debug_path = OUTPUT_DIR / "debug.html"
+    with open(debug_path, "w", encoding="utf-8") as f:
+        f.write(html)
 
-        # Debug save
-        debug_path = OUTPUT_DIR / "debug.html"
-        with open(debug_path, "w", encoding="utf-8") as f:
-            f.write(html)
+    return html, load_stats
 
-        await browser.close()
-        return html
 
+async def fetch_html_tiered(url, required_markers=None, report=None):
+    """
+    Try a plain HTTP GET first and only render in Playwright when the static
+    HTML looks JS-rendered. Returns (html, load_stats) like fetch_html_playwright,
+    with load_stats["tier"] naming the tier that produced the HTML.
+    """
+    started = asyncio.get_running_loop().time()
+    html, reason = await asyncio.to_thread(try_http_tier, url, required_markers=required_markers)
+    if html is not None:
+        seconds = round(asyncio.get_running_loop().time() - started, 2)
+        print(f"Fetched {url} over plain HTTP in {seconds}s")
+        return html, {"tier": HTTP_TIER, "scrolls": 0, "seconds": seconds, "stable": True}
 
-def clean_html(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    for element in soup.find_all(['header', 'footer']):
-        element.decompose()
-    return str(soup)
+    print(f"Escalating {url} to Playwright: {reason}")
+    html, load_stats = await fetch_html_playwright(url, report=report)
+    browser_tier_worked(url)
+    load_stats["tier"] = BROWSER_TIER
+    load_stats["escalation_reason"] = reason
+    return html, load_stats
 
 
 def html_to_markdown_with_readability(html_content):
-    cleaned_html = clean_html(html_content)
-    converter = html2text.HTML2Text()
-    converter.ignore_links = False
-    return converter.handle(cleaned_html)
+    # One parse: header/footer are dropped while the Markdown is written
+    return html_to_markdown(html_content, remove_tags=MARKDOWN_REMOVED_TAGS)
+
+
+def count_tokens(text, model):
+    """Token count of `text`; models tiktoken doesn't know are counted with gpt-4o-mini's encoding."""
+    return len(get_encoder(model).encode(text))
+
+
+def html_to_markdown_with_listings(html_content):
+    """Convert to Markdown with listing markers for chunk_markdown(), without removing anything."""
+    return html_to_markdown_with_readability(mark_listing_boundaries(html_content))
+
+
+def html_to_markdown_with_extraction(html_content, selected_model):
+    """
+    Strip navigation, sidebars, banners and other boilerplate (listings are kept)
+    before converting to Markdown with listing markers. Returns (markdown, content_stats),
+    where content_stats also holds the page's token count before extraction (the kept
+    and removed parts, each converted once) and after it.
+    """
+    removed_html = []
+    content_html, content_stats = extract_main_content(
+        html_content, mark_listings=True, removed_html=removed_html
+    )
+    markdown = html_to_markdown_with_readability(content_html)
+    content_stats["tokens_after"] = count_tokens(strip_listing_markers(markdown), selected_model)
+    # Kept plus removed Markdown stands in for the whole page, so it is converted only once
+    removed_markdown = html_to_markdown_with_readability("".join(removed_html)) if removed_html else ""
+    content_stats["tokens_before"] = content_stats["tokens_after"] + count_tokens(removed_markdown, selected_model)
+    return markdown, content_stats
+
+
+def compact_markdown_for_model(markdown, selected_model):
+    """
+    Shorten URLs to references, drop decorative images and duplicate lines.
+    Returns (compacted, url_table, stats); stats holds the token counts before
+    and after, counted like pricing does. Pass url_table to restore_urls() on
+    the model's output.
+    """
+    compacted, url_table, stats = compact_markdown(markdown)
+    stats["tokens_uncompacted"] = count_tokens(strip_listing_markers(markdown), selected_model)
+    stats["tokens_compacted"] = count_tokens(strip_listing_markers(compacted), selected_model)
+    return compacted, url_table, stats
+
+
+def chunk_markdown(markdown, selected_model, max_tokens):
+    """
+    Pack whole listings into chunks of at most `max_tokens` (no overlap).
+    Returns (chunks, chunk_stats); see common.chunking.
+    """
+    return chunk_by_listings(markdown, max_tokens, lambda text: count_tokens(text, selected_model))
 
 
 def save_raw_data(raw_data, timestamp, output_folder='output'):
@@ -143,7 +300,7 @@ def create_listings_container_model(listing_model: Type[BaseModel]) -> Type[Base
     return create_model('DynamicListingsContainer', listings=(List[listing_model], ...))
 
 
-def fix_json_output(broken_json: str, model_obj, system_message: str, user_message: str, data: str) -> str:
+def fix_json_output(broken_json: str, model_obj, system_message: str, user_message: str, data: str):
     fix_prompt = (
         "\nThe JSON above is invalid or incomplete. "
         "Please correct it and output only valid JSON with no additional text."
@@ -155,7 +312,19 @@ def fix_json_output(broken_json: str, model_obj, system_message: str, user_messa
         + "\nBroken JSON:\n" + broken_json
     )
     fixed_completion = model_obj.generate_content(full_prompt)
-    return fixed_completion.text
+    usage_metadata = fixed_completion.usage_metadata
+    return fixed_completion.text, {
+        "input_tokens": usage_metadata.prompt_token_count,
+        "output_tokens": usage_metadata.candidates_token_count
+    }
+
+
+def parse_completion_json(text, token_counts):
+    """json.loads() for a paid completion; a bad reply raises LLMResponseError carrying its usage."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise LLMResponseError(f"Model returned invalid JSON: {e}", token_counts) from e
 
 
 def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_model):
@@ -169,7 +338,7 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
     # 1. GPT-based (OpenAI) Models
     # -----------------------------------
     if selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
-        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        client = get_openai_client(os.getenv('OPENAI_API_KEY'))
         completion = client.beta.chat.completions.parse(
             model=selected_model,
             messages=[
@@ -178,7 +347,7 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
             ],
             response_format=DynamicListingsContainer
         )
-        encoder = tiktoken.encoding_for_model(selected_model)
+        encoder = get_encoder(selected_model)
         input_token_count = len(encoder.encode(USER_MESSAGE + data))
         output_token_count = len(
             encoder.encode(json.dumps(completion.choices[0].message.parsed.dict()))
@@ -200,13 +369,12 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
     # 2. Gemini (Google) Model
     # -----------------------------------
     elif selected_model == "gemini-2.0-flash":
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
         # Build a strict schema based on user-selected fields
         strict_schema = create_dynamic_schema(field_list)
 
-        model_obj = genai.GenerativeModel(
+        model_obj = get_gemini_model(
             'gemini-2.0-flash',
+            os.getenv("GEMINI_API_KEY"),
             generation_config={
                 "response_mime_type": "application/json",
                 "response_schema": strict_schema
@@ -232,9 +400,11 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
             except json.JSONDecodeError as e:
                 print("Initial JSON parsing failed:", e)
                 # Attempt fix
-                fixed_output = fix_json_output(
+                fixed_output, fix_tokens = fix_json_output(
                     output_text, model_obj, SYSTEM_MESSAGE, USER_MESSAGE, data
                 )
+                token_counts["input_tokens"] += fix_tokens["input_tokens"]
+                token_counts["output_tokens"] += fix_tokens["output_tokens"]
                 try:
                     final_json = json.loads(fixed_output)
                     output_text = fixed_output
@@ -255,7 +425,7 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
     # 3. Local Llama
     # -----------------------------------
     elif selected_model == "Llama3.1 8B":
-        client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
+        client = get_openai_client("lm-studio", base_url="http://localhost:1234/v1")
         completion = client.chat.completions.create(
             model=LLAMA_MODEL_FULLNAME,
             messages=[
@@ -264,12 +434,11 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
             ],
             temperature=0.7,
         )
-        response_content = completion.choices[0].message.content
-        parsed_response = json.loads(response_content)
         token_counts = {
             "input_tokens": completion.usage.prompt_tokens,
             "output_tokens": completion.usage.completion_tokens
         }
+        parsed_response = parse_completion_json(completion.choices[0].message.content, token_counts)
 
         if "listings" in parsed_response:
             parsed_response["listings"] = postprocess_listings(parsed_response["listings"], field_list)
@@ -281,7 +450,7 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
     # 4. Groq Model
     # -----------------------------------
     elif selected_model == "Groq Llama3.1 70b":
-        client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+        client = get_groq_client(os.environ.get("GROQ_API_KEY"))
         completion = client.chat.completions.create(
             messages=[
                 {"role": "system", "content": SYSTEM_MESSAGE},
@@ -289,12 +458,11 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
             ],
             model=GROQ_LLAMA_MODEL_FULLNAME,
         )
-        response_content = completion.choices[0].message.content
-        parsed_response = json.loads(response_content)
         token_counts = {
             "input_tokens": completion.usage.prompt_tokens,
             "output_tokens": completion.usage.completion_tokens
         }
+        parsed_response = parse_completion_json(completion.choices[0].message.content, token_counts)
 
         if "listings" in parsed_response:
             parsed_response["listings"] = postprocess_listings(parsed_response["listings"], field_list)
@@ -306,6 +474,58 @@ def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_mo
         raise ValueError(f"Unsupported model: {selected_model}")
 
 
+def ask_model_for_recipe(sample_html, fields, selected_model):
+    """
+    Ask the selected model for CSS selectors that extract `fields` from the
+    listings in `sample_html` (see common.recipes). Returns (recipe, token_counts).
+    An unparseable reply raises LLMResponseError carrying its usage.
+    """
+    prompt = RECIPE_USER_MESSAGE.format(fields=json.dumps(fields)) + sample_html
+
+    if selected_model == "gemini-2.0-flash":
+        model_obj = get_gemini_model(
+            'gemini-2.0-flash',
+            os.getenv("GEMINI_API_KEY"),
+            generation_config={"response_mime_type": "application/json"}
+        )
+        completion = model_obj.generate_content(RECIPE_SYSTEM_MESSAGE + "\n" + prompt)
+        token_counts = {
+            "input_tokens": completion.usage_metadata.prompt_token_count,
+            "output_tokens": completion.usage_metadata.candidates_token_count
+        }
+        return parse_completion_json(completion.text, token_counts), token_counts
+
+    if selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
+        client = get_openai_client(os.getenv('OPENAI_API_KEY'))
+        model_name = selected_model
+    elif selected_model == "Llama3.1 8B":
+        client = get_openai_client("lm-studio", base_url="http://localhost:1234/v1")
+        model_name = LLAMA_MODEL_FULLNAME
+    elif selected_model == "Groq Llama3.1 70b":
+        client = get_groq_client(os.environ.get("GROQ_API_KEY"))
+        model_name = GROQ_LLAMA_MODEL_FULLNAME
+    else:
+        raise ValueError(f"Unsupported model: {selected_model}")
+
+    completion = client.chat.completions.create(
+        model=model_name,
+        messages=[
+            {"role": "system", "content": RECIPE_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0,
+    )
+    token_counts = {
+        "input_tokens": completion.usage.prompt_tokens,
+        "output_tokens": completion.usage.completion_tokens
+    }
+    content = completion.choices[0].message.content.strip()
+    if content.startswith("```"):
+        # Models without a JSON mode like to fence their answer
+        content = content.strip("`").removeprefix("json")
+    return parse_completion_json(content, token_counts), token_counts
+
+
 def save_formatted_data(formatted_data, timestamp, output_folder='output'):
     os.makedirs(output_folder, exist_ok=True)
 
@@ -342,7 +562,7 @@ if __name__ == "__main__":
     fields = ["city", "library", "address", "zip", "phone"]  # example
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-    raw_html = asyncio.run(fetch_html_playwright(url))
+    raw_html, load_stats = asyncio.run(fetch_html_tiered(url))
     markdown = html_to_markdown_with_readability(raw_html)
     save_raw_data(markdown, timestamp)
 
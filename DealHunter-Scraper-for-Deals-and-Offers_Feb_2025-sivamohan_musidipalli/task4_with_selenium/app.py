@@ -5,14 +5,22 @@ import json
 from datetime import datetime
 
 from scraper import (
-    fetch_html_selenium, 
+    fetch_html_tiered, 
     save_raw_data, 
     format_data, 
     save_formatted_data, 
     calculate_price, 
-    html_to_markdown_with_readability, 
+    html_to_markdown_with_listings,
+    html_to_markdown_with_extraction,
+    compact_markdown_for_model,
+    restore_urls,
+    strip_listing_markers,
+    try_recipe,
+    learn_recipe,
+    ask_model_for_recipe,
     create_dynamic_listing_model, 
     create_listings_container_model,
+    RunReport,
     PRICING
 )
 
@@ -26,6 +34,11 @@ model_selection = st.sidebar.selectbox(
     index=0
 )
 url_input = st.sidebar.text_input("Enter URL HERE")
+extract_content = st.sidebar.checkbox(
+    "Extract main content",
+    value=True,
+    help="Drop navigation, sidebars, banners and link lists before the page is sent to the model"
+)
 
 fields = st_tags_sidebar(
     label='Fields to Extract:',
@@ -41,12 +54,25 @@ def perform_scrape():
     st.write("**DEBUG**: Starting `perform_scrape`...")
 
     # 1) Scrape raw HTML
-    st.write("**DEBUG**: Fetching HTML with Selenium from:", url_input)
-    raw_html = fetch_html_selenium(url_input)
-
-    # 2) Convert to markdown
-    st.write("**DEBUG**: Converting HTML to Markdown...")
-    markdown = html_to_markdown_with_readability(raw_html)
+    st.write("**DEBUG**: Fetching HTML (plain HTTP first, Selenium if needed) from:", url_input)
+    report = RunReport(url_input)
+    raw_html, load_stats = fetch_html_tiered(url_input, report=report)
+
+    # 2) Strip boilerplate and convert to markdown
+    if extract_content:
+        st.write("**DEBUG**: Extracting main content and converting HTML to Markdown...")
+        markdown, content_stats = html_to_markdown_with_extraction(raw_html, model_selection)
+        st.write("**DEBUG**: Content extraction stats:", content_stats)
+    else:
+        st.write("**DEBUG**: Converting HTML to Markdown...")
+        markdown, content_stats = html_to_markdown_with_listings(raw_html), {}
+    content_stats.update(load_stats)
+
+    # 2b) Compact the markdown the model sees (URLs become short references)
+    compacted, url_table, compaction_stats = compact_markdown_for_model(markdown, model_selection)
+    content_stats.update(compaction_stats)
+    st.write("**DEBUG**: Compaction stats:", compaction_stats)
+    markdown = strip_listing_markers(markdown)
     save_raw_data(markdown, timestamp)
 
     # 3) Create dynamic Pydantic models
@@ -54,15 +80,40 @@ def perform_scrape():
     DynamicListingModel = create_dynamic_listing_model(fields)
     DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
 
-    # 4) Format data (calls one of the LLMs with chunking)
-    st.write("**DEBUG**: Formatting data with model:", model_selection)
-    formatted_data, tokens_count = format_data(
-        data=markdown, 
-        ContainerModel=DynamicListingsContainer, 
-        ListingModel=DynamicListingModel, 
-        selected_model=model_selection,
-        fields=fields
-    )
+    # 4) Format data: selectors learned on an earlier page of this site, else the LLM (with chunking)
+    listings, recipe_stats = try_recipe(url_input, raw_html, fields)
+    content_stats.update(recipe_stats)
+    st.write("**DEBUG**: Learned selectors:", recipe_stats)
+    if listings is not None:
+        formatted_data = json.dumps({"listings": listings}, indent=4)
+        tokens_count = {"input_tokens": 0, "output_tokens": 0}
+    else:
+        st.write("**DEBUG**: Formatting data with model:", model_selection)
+        formatted_data, tokens_count = format_data(
+            data=compacted, 
+            ContainerModel=DynamicListingsContainer, 
+            ListingModel=DynamicListingModel, 
+            selected_model=model_selection,
+            fields=fields,
+            report=report
+        )
+        formatted_data = restore_urls(formatted_data, url_table)
+
+        # 4b) Learn selectors from this page so the next one can skip the LLM
+        try:
+            llm_listings = json.loads(formatted_data).get("listings", [])
+        except (json.JSONDecodeError, AttributeError):
+            llm_listings = []
+        recipe_stats, recipe_tokens = learn_recipe(
+            url_input, raw_html, fields, llm_listings,
+            lambda sample, names: ask_model_for_recipe(sample, names, model_selection)
+        )
+        content_stats.update(recipe_stats)
+        st.write("**DEBUG**: Learned selectors:", recipe_stats)
+        tokens_count = {
+            "input_tokens": tokens_count.get("input_tokens", 0) + recipe_tokens.get("input_tokens", 0),
+            "output_tokens": tokens_count.get("output_tokens", 0) + recipe_tokens.get("output_tokens", 0)
+        }
 
     # 5) Calculate token usage
     st.write("**DEBUG**: Calculating token usage...")
@@ -78,7 +129,7 @@ def perform_scrape():
         print("PERFORM_SCRAPE DEBUG: df is None!")
 
     st.write("**DEBUG**: Done. Returning DF, etc.")
-    return df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp
+    return df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp, content_stats, report
 
 if 'perform_scrape' not in st.session_state:
     st.session_state['perform_scrape'] = False
@@ -90,7 +141,12 @@ if st.sidebar.button("click Scrape"):
 
 if st.session_state.get('perform_scrape'):
     st.write("**DEBUG**: We have `perform_scrape` = True, so let's unpack results.")
-    df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp = st.session_state['results']
+    df, formatted_data, markdown, input_tokens, output_tokens, total_cost, timestamp, content_stats, report = st.session_state['results']
+
+    failures = report.as_records()
+    if failures:
+        with st.expander(f"⚠️ {len(failures)} request(s) failed after {report.retries} retries"):
+            st.dataframe(pd.DataFrame(failures), use_container_width=True)
 
     if df is None:
         st.error("The DataFrame (df) is None. Possibly no data extracted.")
@@ -105,6 +161,20 @@ if st.session_state.get('perform_scrape'):
     st.sidebar.markdown(f"Output Tokens: {output_tokens}")
     st.sidebar.markdown(f"Total Cost: :green[${total_cost:.4f}]")
 
+    st.sidebar.markdown("**Page Load**")
+    blocking = content_stats.get("blocking", {})
+    st.sidebar.markdown(f"Fetched With: {content_stats.get('tier', 'browser')}")
+    st.sidebar.markdown(f"Requests Blocked: {blocking.get('blocked_requests', 0)}")
+    st.sidebar.markdown(f"Est. Bandwidth Saved: {blocking.get('bytes_saved', 0) / 1024:.0f} KB")
+
+    if "tokens_before" in content_stats:
+        st.sidebar.markdown("**Content Extraction**")
+        st.sidebar.markdown(f"Page Tokens: {content_stats['tokens_before']} → {content_stats['tokens_after']}")
+        st.sidebar.markdown(f"Tokens Saved: {content_stats['tokens_before'] - content_stats['tokens_after']}")
+    st.sidebar.markdown("**Markdown Compaction**")
+    st.sidebar.markdown(f"Page Tokens: {content_stats['tokens_uncompacted']} → {content_stats['tokens_compacted']}")
+    st.sidebar.markdown(f"Tokens Saved: {content_stats['tokens_uncompacted'] - content_stats['tokens_compacted']}")
+
     # Provide download buttons
     col1, col2, col3 = st.columns(3)
 
@@ -84,9 +84,14 @@ PRICING = {
 # Timeout settings for web scraping
 TIMEOUT_SETTINGS = {
     "page_load": 30,
-    "script": 10
+    "script": 10,
+    "connect": 5,   # plain HTTP connect timeout
+    "read": 15      # plain HTTP read timeout
 }
 
+# Elements dropped (with everything inside them) before the page becomes Markdown
+MARKDOWN_REMOVED_TAGS = ("header", "footer")
+
 # Other reusable constants or configuration settings
 HEADLESS_OPTIONS = [ "--headless=new","--disable-gpu", "--disable-dev-shm-usage","--window-size=1920,1080","--disable-search-engine-choice-screen"]
 
@@ -0,0 +1,145 @@
+# driver_pool.py
+#
+# Thread-safe pool of warm Chrome WebDriver sessions. Spawning chromedriver
+# and Chrome costs seconds per URL, so drivers are created once, reset
+# between uses (cookies, storage, open page) and replaced if they crash.
+
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+
+class DriverPool:
+    """Keeps up to `size` drivers built by `factory()` and hands them out one at a time."""
+
+    def __init__(self, factory, size=3):
+        self.factory = factory
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """
+        Borrow a driver. If the body raises a WebDriverException the driver
+        is assumed broken and replaced instead of being returned to the pool.
+        """
+        driver = self._acquire(timeout)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            # Timeouts are WebDriverExceptions too; only drop drivers that stopped responding
+            broken = not self._is_alive(driver)
+            raise
+        finally:
+            self._release(driver, broken)
+
+    def close(self):
+        """Quit every idle driver. Drivers currently borrowed are quit on release."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    # -------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------
+    def _acquire(self, timeout):
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            driver = self._idle.get(timeout=timeout)
+
+        if not self._is_alive(driver):
+            self._quit(driver)
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return driver
+
+    def _release(self, driver, broken):
+        if broken or self._closed or not self._reset(driver):
+            self._quit(driver)
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(driver)
+
+    @staticmethod
+    def _is_alive(driver):
+        try:
+            driver.execute_script("return 1;")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(driver):
+        """Clear per-site state so the next user starts clean. Returns False if the driver died."""
+        try:
+            # delete_all_cookies() and localStorage.clear() only reach the current origin;
+            # CDP clears cookies and storage (IndexedDB, service workers, ...) of every origin
+            driver.execute_script("try { window.sessionStorage.clear(); } catch (e) {}")
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": "*", "storageTypes": "all"})
+            driver.get("about:blank")
+            driver.get_log("performance")  # drop log entries from the previous page
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool(factory, size):
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = DriverPool(factory, size)
+        return _pool
+
+
+def shutdown_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(shutdown_driver_pool)
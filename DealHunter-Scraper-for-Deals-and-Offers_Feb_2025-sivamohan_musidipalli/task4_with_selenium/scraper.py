@@ -1,24 +1,40 @@
 import os
+import sys
 import random
-import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Type
 from pathlib import Path
 
 import pandas as pd
-from bs4 import BeautifulSoup
 from pydantic import BaseModel, create_model
-import html2text
-import tiktoken
 
 from dotenv import load_dotenv
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
 import demjson3  # Tolerant JSON parser fallback
 
+# Make the shared helpers in ../common importable when run via `streamlit run`
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.resource_blocking import ResourcePolicy, BlockStats
+from common.tiered_fetch import try_http_tier, browser_tier_worked, HTTP_TIER, BROWSER_TIER
+from common.resilience import call_with_retries, RunReport
+from common.http_client import configure_http_client
+from common.html_markdown import html_to_markdown
+from common.content_extraction import extract_main_content, mark_listing_boundaries
+from common.chunking import chunk_by_listings, strip_listing_markers
+from common.markdown_compaction import compact_markdown, restore_urls
+from common.recipes import try_recipe, learn_recipe
+from common.llm_dispatch import dispatch_chunks, LLMResponseError
+from common.llm_clients import get_gemini_model, get_encoder
+from assets import TIMEOUT_SETTINGS, MARKDOWN_REMOVED_TAGS
+from driver_pool import get_driver_pool
+
 load_dotenv()
+configure_http_client(timeout_settings=TIMEOUT_SETTINGS)
 
 ###############################################################################
 # Configuration
@@ -34,54 +50,180 @@ PRICING = {
     "gemini-2.0-flash": {"input": 0.0001, "output": 0.0003},
     "groq-llama": {"input": 0.0, "output": 0.0},          # Example
 }
+# tiktoken model used to count tokens for each model above; others use gpt-4o-mini's encoding
+TOKENIZER_MODELS = {
+    "openai-gpt-3.5": "gpt-3.5-turbo",
+}
 
 # Path to your local ChromeDriver
 DRIVER_PATH = r"C:\Users\sivam\.wdm\drivers\chromedriver\win64\133.0.6943.126\chromedriver-win32\chromedriver.exe"
 DRIVER_DIR = Path(__file__).parent / "drivers"
 os.environ['WDM_LOCAL'] = str(DRIVER_DIR)
 
+# Warm Chrome sessions kept by the driver pool
+DRIVER_POOL_SIZE = 3
+PAGE_LOAD_TIMEOUT = TIMEOUT_SETTINGS["page_load"]  # seconds
+
 ###############################################################################
 # Selenium
 ###############################################################################
-def setup_selenium():
-    """Set up the Selenium driver with random user-agent & headless options."""
+def setup_selenium(policy=None):
+    """
+    Set up the Selenium driver with random user-agent & headless options.
+    URLs matching `policy` (default ResourcePolicy()) are blocked through DevTools.
+    """
+    policy = policy or ResourcePolicy()
     options = Options()
     user_agent = random.choice(USER_AGENTS)
     options.add_argument(f"user-agent={user_agent}")
     for opt in HEADLESS_OPTIONS:
         options.add_argument(opt)
+    # Performance log lets us count the requests Chrome blocked
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
 
     service = Service(DRIVER_PATH)
     driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(TIMEOUT_SETTINGS["page_load"])
+    driver.set_script_timeout(TIMEOUT_SETTINGS["script"])
+
+    # Network.setBlockedURLs only understands URL wildcards, so resource
+    # types are approximated by file extension.
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": policy.url_patterns()})
     return driver
 
-def fetch_html_selenium(url: str) -> str:
-    """Fetch page HTML using Selenium (with a small wait and scroll)."""
-    driver = setup_selenium()
+def collect_block_stats(driver, policy=None) -> dict:
+    """Read the performance log and count requests Chrome blocked since the last read."""
+    policy = policy or ResourcePolicy()
+    stats = BlockStats()
+    request_info = {}
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"]).get("message", {})
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            request_info[params.get("requestId")] = (
+                params.get("request", {}).get("url", ""),
+                params.get("type", "Other").lower()
+            )
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            url, resource_type = request_info.get(params.get("requestId"), ("", "other"))
+            stats.record_blocked(resource_type, policy.block_reason(url, resource_type) or "pattern")
+        elif method == "Network.loadingFinished":
+            stats.record_allowed()
+    return stats.as_dict()
+
+def wait_until_ready(driver, timeout=PAGE_LOAD_TIMEOUT):
+    """Wait for document.readyState == 'complete'."""
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+    )
+
+def wait_until_height_stable(driver, timeout=PAGE_LOAD_TIMEOUT, poll=0.5):
+    """Wait until the page height stops growing between two polls (lazy content loaded)."""
+    last_height = [None]
+
+    def height_settled(d):
+        height = d.execute_script("return document.body ? document.body.scrollHeight : 0")
+        settled = height == last_height[0]
+        last_height[0] = height
+        return settled
+
     try:
-        driver.get(url)
-        time.sleep(2)
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
-        return driver.page_source
-    finally:
-        driver.quit()
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(height_settled)
+    except Exception:
+        pass  # keep whatever has loaded by the deadline
+
+def fetch_html_selenium(url: str, policy=None, report=None):
+    """
+    Fetch page HTML using a pooled Selenium driver, waiting for the page to settle.
+    Returns (html, load_stats); load_stats["blocking"] counts the requests Chrome blocked.
+    Failed loads are retried with backoff and recorded in `report`.
+    """
+    policy = policy or ResourcePolicy()
+    pool = get_driver_pool(setup_selenium, DRIVER_POOL_SIZE)
+
+    def load():
+        with pool.driver() as driver:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": policy.url_patterns()})
+            driver.get(url)
+            wait_until_ready(driver)
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            wait_until_height_stable(driver)
+            block_stats = collect_block_stats(driver, policy)
+            print(
+                f"Blocked {block_stats['blocked_requests']} requests "
+                f"(~{block_stats['bytes_saved'] // 1024} KB) on {url}"
+            )
+            return driver.page_source, {"blocking": block_stats}
+
+    return call_with_retries(url, load, report=report, context="browser fetch")
+
+def fetch_html_tiered(url: str, required_markers: List[str] = None, report=None):
+    """
+    Try a plain HTTP GET first; fall back to Selenium only when the page looks JS-rendered.
+    Returns (html, load_stats) with load_stats["tier"] naming the tier that produced the HTML.
+    """
+    html, reason = try_http_tier(url, required_markers=required_markers)
+    if html is not None:
+        print(f"Fetched {url} over plain HTTP")
+        return html, {"tier": HTTP_TIER, "blocking": {}}
+    print(f"Escalating {url} to Selenium: {reason}")
+    html, load_stats = fetch_html_selenium(url, report=report)
+    browser_tier_worked(url)
+    load_stats["tier"] = BROWSER_TIER
+    load_stats["escalation_reason"] = reason
+    return html, load_stats
+
+def fetch_many_html_selenium(urls: List[str], policy=None) -> List[str]:
+    """Fetch several URLs in parallel across the driver pool. Results keep input order."""
+    with ThreadPoolExecutor(max_workers=DRIVER_POOL_SIZE) as executor:
+        return [html for html, _ in executor.map(lambda u: fetch_html_selenium(u, policy), urls)]
 
 ###############################################################################
 # Convert HTML -> Markdown
 ###############################################################################
-def clean_html(html_content: str) -> str:
-    """Optionally remove header/footer if not needed."""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    for elem in soup.find_all(['header', 'footer']):
-        elem.decompose()
-    return str(soup)
-
 def html_to_markdown_with_readability(html_content: str) -> str:
-    cleaned = clean_html(html_content)
-    converter = html2text.HTML2Text()
-    converter.ignore_links = False
-    return converter.handle(cleaned)
+    """Convert to Markdown in a single parse, dropping header/footer on the way."""
+    return html_to_markdown(html_content, remove_tags=MARKDOWN_REMOVED_TAGS)
+
+def html_to_markdown_with_listings(html_content: str) -> str:
+    """Convert to Markdown with listing markers for chunking, without removing anything."""
+    return html_to_markdown_with_readability(mark_listing_boundaries(html_content))
+
+def count_tokens(text: str, model_name: str = "openai-gpt-3.5") -> int:
+    """Approximate token count for `model_name` (a PRICING key or a tiktoken model name)."""
+    return len(get_encoder(TOKENIZER_MODELS.get(model_name, model_name)).encode(text))
+
+def html_to_markdown_with_extraction(html_content: str, selected_model: str = "openai-gpt-3.5"):
+    """
+    Strip navigation, sidebars, banners and other boilerplate (listings are kept)
+    before converting to Markdown with listing markers for chunking. Returns
+    (markdown, content_stats), where content_stats also holds the page's token
+    count before extraction (the kept and removed parts, each converted once)
+    and after it.
+    """
+    removed_html = []
+    content_html, content_stats = extract_main_content(
+        html_content, mark_listings=True, removed_html=removed_html
+    )
+    markdown = html_to_markdown_with_readability(content_html)
+    content_stats["tokens_after"] = count_tokens(strip_listing_markers(markdown), selected_model)
+    # Kept plus removed Markdown stands in for the whole page, so it is converted only once
+    removed_markdown = html_to_markdown_with_readability("".join(removed_html)) if removed_html else ""
+    content_stats["tokens_before"] = content_stats["tokens_after"] + count_tokens(removed_markdown, selected_model)
+    return markdown, content_stats
+
+def compact_markdown_for_model(markdown: str, selected_model: str = "openai-gpt-3.5"):
+    """
+    Shorten URLs to references, drop decorative images and duplicate lines.
+    Returns (compacted, url_table, stats); stats holds the token counts before
+    and after. Pass url_table to restore_urls() on the model's output.
+    """
+    compacted, url_table, stats = compact_markdown(markdown)
+    stats["tokens_uncompacted"] = count_tokens(strip_listing_markers(markdown), selected_model)
+    stats["tokens_compacted"] = count_tokens(strip_listing_markers(compacted), selected_model)
+    return compacted, url_table, stats
 
 def save_raw_data(raw_data: str, timestamp: str, output_folder='output'):
     """Save raw markdown data for debugging."""
@@ -112,6 +254,7 @@ def build_prompts(fields: List[str]):
 
     system_message = f"""You are an intelligent text extraction assistant.
 Return only valid JSON with no markdown or extra text.
+Links and images appear as short references such as ref:12; copy a reference exactly for URL or image fields.
 Structure: {{"listings":[{{{fields_example}}}]}}
 """
 
@@ -127,28 +270,26 @@ Return them in the JSON structure above.
 ###############################################################################
 # Chunking the text to avoid truncation
 ###############################################################################
-def chunk_text_by_tokens(text: str, model_name: str = "gpt-3.5-turbo", max_chunk_tokens=2500):
+def chunk_text_by_tokens(text: str, model_name: str = "openai-gpt-3.5", max_chunk_tokens=2500):
     """
-    Splits a large string into smaller chunks by token count 
-    so we don't exceed model output limits.
-    We use GPT-3.5's tiktoken for approximate counting, 
-    but it should be okay for other LLMs too.
+    Splits the markdown into chunks of at most max_chunk_tokens, packing whole
+    listings (see html_to_markdown_with_extraction) so none is cut in half and
+    nothing is sent twice. GPT-3.5's tiktoken is an approximate count for the
+    other LLMs too.
     """
-    encoder = tiktoken.encoding_for_model(model_name)
-    tokens = encoder.encode(text)
-    chunks = []
-    start = 0
-    while start < len(tokens):
-        end = start + max_chunk_tokens
-        chunk_tokens = tokens[start:end]
-        chunk_text = encoder.decode(chunk_tokens)
-        chunks.append(chunk_text)
-        start = end
+    chunks, _ = chunk_by_listings(text, max_chunk_tokens, lambda chunk: count_tokens(chunk, model_name))
     return chunks
 
 ###############################################################################
 # Extract JSON from text
 ###############################################################################
+def extract_chunk_listings(response_text: str, token_counts: dict) -> list:
+    """Listings from one chunk's reply; an unparseable reply raises LLMResponseError so the chunk is retried."""
+    parsed_chunk = extract_json(response_text)
+    if "raw_text" in parsed_chunk:
+        raise LLMResponseError("Model returned invalid JSON", token_counts)
+    return parsed_chunk.get("listings", [])
+
 def extract_json(text: str) -> dict:
     """Try standard json.loads, else fallback to demjson3."""
     text = text.strip("`").strip()
@@ -171,7 +312,8 @@ def format_data(
     ContainerModel: Type[BaseModel],
     ListingModel: Type[BaseModel],
     selected_model: str,
-    fields: List[str]
+    fields: List[str],
+    report=None
 ):
     """
     We handle multiple model choices here:
@@ -179,6 +321,7 @@ def format_data(
     - gemini-2.0-flash
     - groq-llama
     etc.
+    Chunks that fail after retries are recorded in `report`.
     """
     system_message, user_message = build_prompts(fields)
 
@@ -187,39 +330,46 @@ def format_data(
         import openai
         openai.api_key = os.getenv("OPENAI_API_KEY")
         # We'll do chunking with openai completions
-        return _format_with_openai(data, system_message, user_message)
+        return _format_with_openai(data, system_message, user_message, report)
 
     elif selected_model == "gemini-2.0-flash":
-        import google.generativeai as genai
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        return _format_with_gemini(data, system_message, user_message)
+        return _format_with_gemini(data, system_message, user_message, report)
 
     elif selected_model == "groq-llama":
         import groq
         # We'll do chunking with groq's LLM (hypothetical)
         # Make sure you have your GROQ_API_KEY in .env
-        return _format_with_groq(data, system_message, user_message)
+        return _format_with_groq(data, system_message, user_message, report)
 
     else:
         # If user picks something else, or not implemented, return empty
         print(f"WARNING: Model {selected_model} not implemented. Returning empty.")
         return "", {"input_tokens": 0, "output_tokens": 0}
 
+###############################################################################
+# Merge per-chunk results (chunks are sent concurrently, see common.llm_dispatch)
+###############################################################################
+def _merge_chunk_listings(chunk_results, token_counts):
+    """Concatenate listings in chunk order, skipping chunks that failed every retry."""
+    all_listings = []
+    for listings in chunk_results:
+        if listings:
+            all_listings.extend(listings)
+
+    final_json = {"listings": all_listings}
+    final_json_str = json.dumps(final_json, indent=4)
+    return final_json_str, token_counts
+
 ###############################################################################
 # Model-specific chunking for OpenAI
 ###############################################################################
-def _format_with_openai(data, system_message, user_message):
+def _format_with_openai(data, system_message, user_message, report=None):
     import openai
 
     # We'll chunk the data to avoid truncation
-    text_chunks = chunk_text_by_tokens(data, max_chunk_tokens=2000)  # smaller chunk for openai
-    all_listings = []
-    total_input_tokens = 0
-    total_output_tokens = 0
-
-    for i, chunk in enumerate(text_chunks, start=1):
-        prompt = f"{system_message}\n{user_message}\n{chunk}"
+    text_chunks = chunk_text_by_tokens(data, "openai-gpt-3.5", max_chunk_tokens=2000)  # smaller chunk for openai
 
+    def format_chunk(chunk):
         # We'll use ChatCompletion. We can approximate tokens from usage.
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",
@@ -230,96 +380,112 @@ def _format_with_openai(data, system_message, user_message):
             temperature=0
         )
         usage = response["usage"]
-        prompt_tokens = usage["prompt_tokens"]
-        completion_tokens = usage["completion_tokens"]
-
-        total_input_tokens += prompt_tokens
-        total_output_tokens += completion_tokens
-
+        token_counts = {
+            "input_tokens": usage["prompt_tokens"],
+            "output_tokens": usage["completion_tokens"]
+        }
         response_text = response["choices"][0]["message"]["content"]
-        parsed_chunk = extract_json(response_text)
-        if "listings" in parsed_chunk:
-            all_listings.extend(parsed_chunk["listings"])
+        return extract_chunk_listings(response_text, token_counts), token_counts
 
-    final_json = {"listings": all_listings}
-    final_json_str = json.dumps(final_json, indent=4)
-
-    token_counts = {
-        "input_tokens": total_input_tokens,
-        "output_tokens": total_output_tokens
-    }
-    return final_json_str, token_counts
+    return _merge_chunk_listings(*dispatch_chunks(text_chunks, format_chunk, "openai", report=report))
 
 ###############################################################################
 # Model-specific chunking for Gemini
 ###############################################################################
-def _format_with_gemini(data, system_message, user_message):
-    import google.generativeai as genai
-    model_obj = genai.GenerativeModel('gemini-2.0-flash')
+def _format_with_gemini(data, system_message, user_message, report=None):
+    model_obj = get_gemini_model('gemini-2.0-flash', os.getenv("GEMINI_API_KEY"))
 
-    text_chunks = chunk_text_by_tokens(data, max_chunk_tokens=2500)
-    all_listings = []
-    total_input_tokens = 0
-    total_output_tokens = 0
+    text_chunks = chunk_text_by_tokens(data, "gemini-2.0-flash", max_chunk_tokens=2500)
 
-    for i, chunk in enumerate(text_chunks, start=1):
+    def format_chunk(chunk):
         prompt = f"{system_message}\n{user_message}\n{chunk}"
         completion = model_obj.generate_content(prompt)
         usage = completion.usage_metadata
+        token_counts = {
+            "input_tokens": getattr(usage, "prompt_token_count", 0),
+            "output_tokens": getattr(usage, "candidates_token_count", 0)
+        }
+        return extract_chunk_listings(completion.text.strip(), token_counts), token_counts
 
-        prompt_token_count = getattr(usage, "prompt_token_count", 0)
-        candidates_token_count = getattr(usage, "candidates_token_count", 0)
-        total_input_tokens += prompt_token_count
-        total_output_tokens += candidates_token_count
-
-        response_text = completion.text.strip()
-        parsed_chunk = extract_json(response_text)
-        if "listings" in parsed_chunk:
-            all_listings.extend(parsed_chunk["listings"])
-
-    final_json = {"listings": all_listings}
-    final_json_str = json.dumps(final_json, indent=4)
-
-    token_counts = {
-        "input_tokens": total_input_tokens,
-        "output_tokens": total_output_tokens
-    }
-    return final_json_str, token_counts
+    return _merge_chunk_listings(*dispatch_chunks(text_chunks, format_chunk, "gemini", report=report))
 
 ###############################################################################
 # Model-specific chunking for Groq
 ###############################################################################
-def _format_with_groq(data, system_message, user_message):
+def _format_with_groq(data, system_message, user_message, report=None):
     # Hypothetical example: if Groq has a Python library for LLM calls
     import groq
 
-    text_chunks = chunk_text_by_tokens(data, max_chunk_tokens=2500)
-    all_listings = []
-    total_input_tokens = 0
-    total_output_tokens = 0
+    text_chunks = chunk_text_by_tokens(data, "groq-llama", max_chunk_tokens=2500)
 
-    for i, chunk in enumerate(text_chunks, start=1):
+    def format_chunk(chunk):
         prompt = f"{system_message}\n{user_message}\n{chunk}"
 
         # Hypothetical usage
         completion = groq.generate(prompt, model="groq-llama-70b")
         # If groq returns usage in some manner
-        total_input_tokens += completion["prompt_tokens"]
-        total_output_tokens += completion["completion_tokens"]
+        token_counts = {
+            "input_tokens": completion["prompt_tokens"],
+            "output_tokens": completion["completion_tokens"]
+        }
+        return extract_chunk_listings(completion["text"].strip(), token_counts), token_counts
 
-        response_text = completion["text"].strip()
-        parsed_chunk = extract_json(response_text)
-        if "listings" in parsed_chunk:
-            all_listings.extend(parsed_chunk["listings"])
+    return _merge_chunk_listings(*dispatch_chunks(text_chunks, format_chunk, "groq", report=report))
 
-    final_json = {"listings": all_listings}
-    final_json_str = json.dumps(final_json, indent=4)
+###############################################################################
+# Learned selectors (see common.recipes)
+###############################################################################
+def ask_model_for_recipe(sample_html: str, fields: List[str], selected_model: str):
+    """
+    Ask the selected model for CSS selectors that extract `fields` from the
+    listings in `sample_html`. Returns (recipe, token_counts).
+    An unparseable reply raises LLMResponseError carrying its usage.
+    """
+    fields_example = ", ".join([f'"{f}":{{"selector":"","attr":null}}' for f in fields])
+    prompt = f"""You write CSS selectors for web scraping.
+Return only valid JSON with no markdown or extra text.
+Structure: {{"item":"<selector matching every listing>","fields":{{{fields_example}}}}}
+Field selectors are relative to the listing; "attr" names the attribute to read (e.g. "href"), or null for the text.
+Use tag names, classes and attributes from the HTML below and no positional selectors.
 
-    token_counts = {
-        "input_tokens": total_input_tokens,
-        "output_tokens": total_output_tokens
-    }
-    return final_json_str, token_counts
+{sample_html}
+"""
+
+    if selected_model == "openai-gpt-3.5":
+        import openai
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        response = openai.ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0
+        )
+        usage = response["usage"]
+        token_counts = {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"]}
+        response_text = response["choices"][0]["message"]["content"]
+
+    elif selected_model == "gemini-2.0-flash":
+        model_obj = get_gemini_model('gemini-2.0-flash', os.getenv("GEMINI_API_KEY"))
+        completion = model_obj.generate_content(prompt)
+        usage = completion.usage_metadata
+        token_counts = {
+            "input_tokens": getattr(usage, "prompt_token_count", 0),
+            "output_tokens": getattr(usage, "candidates_token_count", 0)
+        }
+        response_text = completion.text
+
+    elif selected_model == "groq-llama":
+        import groq
+        completion = groq.generate(prompt, model="groq-llama-70b")
+        token_counts = {"input_tokens": completion["prompt_tokens"], "output_tokens": completion["completion_tokens"]}
+        response_text = completion["text"]
+
+    else:
+        raise ValueError(f"Model {selected_model} not implemented.")
+
+    recipe = extract_json(response_text)
+    if "raw_text" in recipe:
+        raise LLMResponseError("Model returned invalid JSON for the recipe", token_counts)
+    return recipe, token_counts
 
 ###############################################################################
 # Saving final data
@@ -0,0 +1,42 @@
+# test_dealsheaven_parsing.py
+#
+# The strained lxml parse in week2/dealsheaven.py must read listing pages
+# exactly like a full html.parser tree. The fixtures follow the DealsHeaven
+# listing markup, including cards and pagination with extra classes.
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("lxml")
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "week2"))
+import dealsheaven  # noqa: E402
+
+FIXTURES = sorted((Path(__file__).resolve().parent / "fixtures" / "dealsheaven").glob("*.html"))
+STORE = {"name": "Test Store", "url": "https://dealsheaven.in/store/test"}
+
+# (page count, deals) per fixture, as read by html.parser
+EXPECTED = {
+    "amazon_page1.html": (9, 23),
+    "flipkart_watch_page3.html": (3, 10),
+    "ajio_page1.html": (1, 7),
+}
+
+
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.name)
+def test_fast_parse_matches_html_parser(fixture):
+    content = fixture.read_bytes()
+    fast = dealsheaven.parse_listing_html(content)
+    full = dealsheaven.parse_listing_html(content, fast=False)
+
+    assert dealsheaven.parse_page_count(fast) == dealsheaven.parse_page_count(full)
+    assert dealsheaven.parse_products(fast, STORE) == dealsheaven.parse_products(full, STORE)
+
+
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.name)
+def test_fixture_contents(fixture):
+    soup = dealsheaven.parse_listing_html(fixture.read_bytes())
+    assert (dealsheaven.parse_page_count(soup), len(dealsheaven.parse_products(soup, STORE))) == EXPECTED[fixture.name]
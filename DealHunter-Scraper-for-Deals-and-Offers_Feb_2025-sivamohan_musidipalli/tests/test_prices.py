@@ -0,0 +1,89 @@
+# test_prices.py
+#
+# common/prices.py must return the numbers the regexes below would, on both
+# its factorized and its direct path, and stay inside its time budget.
+
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.prices import add_price_columns, parse_amounts, parse_percentages  # noqa: E402
+
+AMOUNT = re.compile(r"[0-9][0-9,]*(?:\.[0-9]+)?")
+PERCENTAGE = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*%")
+
+EDGE_CASES = [
+    "₹1,299", "Rs. 1,299.50", "1,299.", "N/A", "", None, "45% off", "₹1,29,999 ₹500",
+    "abc12.5.6x", "12..5", ".5", "₹ 0", "1.2,3", "12,.5", "99.99", "x1.", "0.07", "1,",
+    "inf", "nan", "a\n12,3\nb 4", "Buy 2, get 10% off", "1.25 %", "5%%", "50 % 20%",
+]
+
+
+def regex_amount(value):
+    match = AMOUNT.search(value) if isinstance(value, str) else None
+    return float(match.group().replace(",", "")) if match else np.nan
+
+
+def regex_percentage(value):
+    match = PERCENTAGE.search(value) if isinstance(value, str) else None
+    return float(match.group(1)) if match else np.nan
+
+
+def seconds(func):
+    # Best of three, so one slow run on a busy machine doesn't fail the budget
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@pytest.mark.parametrize("distinct", [2000, 20000], ids=["factorized", "direct"])
+def test_amounts_match_regex(distinct):
+    rng = np.random.default_rng(0)
+    values = EDGE_CASES + [
+        f"₹{rng.integers(0, 10**7):,}.{rng.integers(0, 100):02d}" if i % 2 else f"Rs. {rng.integers(0, 10**6)} only"
+        for i in range(distinct)
+    ]
+    expected = pd.Series([regex_amount(value) for value in values], dtype="float64")
+    pd.testing.assert_series_equal(parse_amounts(pd.Series(values, dtype=object)), expected)
+
+
+def test_percentages_match_regex():
+    values = EDGE_CASES + ["Upto 12.5 % off", "Deal"]
+    expected = pd.Series([regex_percentage(value) for value in values], dtype="float64")
+    pd.testing.assert_series_equal(parse_percentages(pd.Series(values, dtype=object)), expected)
+
+
+def test_million_row_catalog_within_budget():
+    # A million deals drawn from 5,000 distinct prices per column
+    rng = np.random.default_rng(0)
+    rows, distinct = 1_000_000, 5000
+    original = np.array([f"₹{value:,}" for value in rng.integers(100, 100_000, distinct)], dtype=object)
+    current = np.array([f"₹{value:,}" for value in rng.integers(50, 50_000, distinct)], dtype=object)
+    discount = np.array([f"{value}% off" for value in range(100)], dtype=object)
+    df = pd.DataFrame({
+        "Original Price": original[rng.integers(0, distinct, rows)],
+        "Current Price": current[rng.integers(0, distinct, rows)],
+        "Discount": discount[rng.integers(0, 100, rows)],
+    })
+
+    assert seconds(lambda: add_price_columns(df)) < 1.0
+    assert add_price_columns(df)["Current Amount"].notna().all()
+
+
+def test_million_distinct_prices_within_budget():
+    # The Arrow kernels are what make this budget; Python's re is several times slower
+    pytest.importorskip("pyarrow")
+    rng = np.random.default_rng(0)
+    prices = pd.Series([f"₹{value:,}" for value in rng.permutation(np.arange(100, 1_000_100))])
+
+    assert seconds(lambda: parse_amounts(prices)) < 1.0
+    assert parse_amounts(prices.iloc[:3]).tolist() == [regex_amount(value) for value in prices.iloc[:3]]
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# catalog_crawl.py
+#
+# Crawl every DealsHeaven store and every page into one deduplicated list.
+#
+# Work is scheduled page by page: first page 1 of every store (which also
+# reveals the page count), then the remaining pages handed out round-robin
+# across stores, so a handful of huge stores can't starve the small ones.
+# A global worker budget caps total concurrency, and a per-host semaphore
+# plus the shared token bucket cap what any single host sees. The semaphore
+# is held only while a request is on the wire, not through rate-limit waits
+# or retry backoff, and the crawl's rate setting is undone when it ends.
+
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from urllib.parse import urlparse
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.rate_limiter import DEFAULT_RATE, DEFAULT_BURST, get_rate_limiter
+from common.resilience import RunReport
+import dealsheaven
+
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 4
+
+
+class CrawlProgress:
+    """Snapshot handed to the progress callback after every finished page."""
+
+    def __init__(self, done, total, stores_discovered, store_count, deals, elapsed):
+        self.done = done
+        self.total = total
+        self.stores_discovered = stores_discovered
+        self.store_count = store_count
+        self.deals = deals
+        self.elapsed = elapsed
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def eta(self):
+        """Seconds remaining, extrapolated from the pace so far (None until known)."""
+        if not self.done or self.stores_discovered < self.store_count:
+            return None
+        return self.elapsed / self.done * (self.total - self.done)
+
+
+def _dedupe_key(deal):
+    link = deal.get('Shop Now Link')
+    if link and link != 'N/A':
+        return link
+    return (deal.get('Store Name'), deal.get('Product Name'), deal.get('Current Price'))
+
+
+def crawl_catalog(stores=None, search_query=None, max_workers=DEFAULT_WORKERS,
+                  per_host=DEFAULT_PER_HOST, requests_per_second=DEFAULT_RATE,
+                  burst=DEFAULT_BURST, max_pages_per_store=None, progress=None,
+                  run_report=None):
+    """
+    Crawl all pages of all `stores` (default: every store on the site).
+
+    `progress(CrawlProgress)` is called from the calling thread, so it may
+    safely update a UI. Returns (deals, report) where deals are deduplicated
+    by Shop Now Link and report holds page/failure/duplicate counts. Every
+    retry and failed request is also recorded in `run_report`.
+    """
+    run_report = run_report if run_report is not None else RunReport("Catalog crawl")
+    stores = stores if stores is not None else dealsheaven.get_all_stores(run_report)
+    started = time.monotonic()
+
+    host_slots = {}
+    host_lock = threading.Lock()
+
+    def host_slot(url):
+        host = urlparse(url).netloc
+        with host_lock:
+            if host not in host_slots:
+                host_slots[host] = threading.BoundedSemaphore(per_host)
+            return host_slots[host]
+
+    def first_page(store):
+        return dealsheaven.fetch_first_page(store, search_query, run_report, host_slot(store['url']))
+
+    def other_page(store, page):
+        return dealsheaven.parse_products(
+            dealsheaven.fetch_page(store, page, search_query, run_report, host_slot(store['url'])), store
+        )
+
+    # Stores whose page 1 is still to fetch, then per-store queues of the
+    # remaining pages, served round-robin
+    first_pages = deque(range(len(stores)))
+    page_queues = deque()
+    results = {}   # (store index, page) -> products
+    failures = []
+    total = len(stores)
+    done = 0
+    discovered = 0
+
+    def next_page_task():
+        if first_pages:
+            return first_pages.popleft(), 1
+        while page_queues:
+            index, pages = page_queues.popleft()
+            if pages:
+                page = pages.popleft()
+                if pages:
+                    page_queues.append((index, pages))
+                return index, page
+        return None
+
+    workers = max(1, max_workers)
+
+    def fill(executor, in_flight):
+        # Keep the global budget full without queueing everything up front
+        while len(in_flight) < workers:
+            task = next_page_task()
+            if task is None:
+                return
+            index, page = task
+            if page == 1:
+                in_flight[executor.submit(first_page, stores[index])] = task
+            else:
+                in_flight[executor.submit(other_page, stores[index], page)] = task
+
+    # The crawl's rate applies to its hosts until it ends; other scrapers get theirs back
+    limiter = get_rate_limiter()
+    previous_rates = {}
+    for store in stores:
+        host = urlparse(store['url']).netloc
+        if host not in previous_rates:
+            bucket = limiter.bucket(host)
+            previous_rates[host] = (bucket.rate, bucket.burst)
+            limiter.configure(host, requests_per_second, burst)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            fill(executor, in_flight)
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index, page = in_flight.pop(future)
+                    store = stores[index]
+                    if page == 1:
+                        discovered += 1
+                    try:
+                        if page == 1:
+                            page_count, products = future.result()
+                            if max_pages_per_store:
+                                page_count = min(page_count, max_pages_per_store)
+                            if page_count > 1:
+                                page_queues.append((index, deque(range(2, page_count + 1))))
+                                total += page_count - 1
+                        else:
+                            products = future.result()
+                        results[(index, page)] = products
+                    except Exception as e:
+                        failures.append({"store": store['name'], "page": page, "error": str(e)})
+                    done += 1
+
+                fill(executor, in_flight)
+
+                if progress is not None:
+                    progress(CrawlProgress(
+                        done, total, discovered, len(stores),
+                        sum(len(p) for p in results.values()), time.monotonic() - started
+                    ))
+    finally:
+        for host, (rate, host_burst) in previous_rates.items():
+            limiter.configure(host, rate, host_burst)
+
+    # Merge in store order, then page order, dropping duplicates
+    deals = []
+    seen_keys = set()
+    duplicates = 0
+    for key in sorted(results):
+        for deal in results[key]:
+            dedupe_key = _dedupe_key(deal)
+            if dedupe_key in seen_keys:
+                duplicates += 1
+                continue
+            seen_keys.add(dedupe_key)
+            deals.append(deal)
+
+    report = {
+        "stores": len(stores),
+        "pages_fetched": len(results),
+        "failures": failures,
+        "retries": run_report.retries,
+        "duplicates_removed": duplicates,
+        "seconds": round(time.monotonic() - started, 1),
+    }
+    return deals, report
+
+
+if __name__ == "__main__":
+    #   python week2/catalog_crawl.py --workers 16 --output catalog.csv
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Crawl every DealsHeaven store.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second per host")
+    parser.add_argument("--max-pages", type=int, default=None, help="cap pages per store")
+    parser.add_argument("--output", default="dealsheaven_catalog.csv")
+    args = parser.parse_args()
+
+    def print_progress(p):
+        eta = f"{p.eta:.0f}s" if p.eta is not None else "estimating"
+        print(f"\r{p.done}/{p.total} pages, {p.deals} deals, ETA {eta}   ", end="", flush=True)
+
+    deals, report = crawl_catalog(
+        max_workers=args.workers, per_host=args.per_host, requests_per_second=args.rate,
+        max_pages_per_store=args.max_pages, progress=print_progress
+    )
+    print()
+    dealsheaven.deals_frame(deals).to_csv(args.output, index=False)
+    print(f"Saved {len(deals)} deals to {args.output} ({report['duplicates_removed']} duplicates removed, "
+          f"{len(report['failures'])} failed pages, {report['retries']} retries, {report['seconds']}s)")
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+# dealsheaven.py
+# Fetching and parsing helpers for dealsheaven.in, shared by the Streamlit app
+# and by longer-running crawls. Nothing in here talks to Streamlit.
+
+import os
+import sys
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    FAST_PARSER = "lxml"
+except ImportError:
+    FAST_PARSER = None
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.rate_limiter import DEFAULT_RATE, DEFAULT_BURST, get_rate_limiter
+from common.resilience import resilient_get
+from common.extraction import compile_spec, absolute_url, https_if_protocol_relative
+from common.prices import add_price_columns
+
+STORES_URL = "https://dealsheaven.in/stores"
+SEEN_DEALS_PATH = Path(__file__).resolve().parent / "output" / "seen_deals.sqlite"
+
+# Incremental crawls stop at the first page where this share of deals is already known
+KNOWN_PAGE_THRESHOLD = 0.8
+
+# The only parts of a listing page we read: product cards and the page links
+LISTING_CLASSES = {"product-item-detail", "pagination"}
+
+
+def _is_listing_part(classes):
+    # bs4 passes the whole class attribute ("col product-item-detail"); match its tokens
+    if not classes:
+        return False
+    if isinstance(classes, str):
+        classes = classes.split()
+    return not LISTING_CLASSES.isdisjoint(classes)
+
+
+LISTING_STRAINER = SoupStrainer(class_=_is_listing_part)
+
+# How a product card maps onto a deal; see common/extraction.py for the format
+PRODUCT_CARD_SPEC = {
+    "item": {"tag": "div", "class": "product-item-detail"},
+    "skip_if": {"tag": "div", "class": "ad-div"},
+    "default": "N/A",
+    "fields": {
+        "Product Name": {"tag": "h3"},
+        "Image URL": {"tag": "img", "class": "lazy", "attr": ["data-src", "src"],
+                      "post": https_if_protocol_relative},
+        "Discount": {"tag": "div", "class": "discount"},
+        "Original Price": {"tag": "p", "class": "price"},
+        "Current Price": {"tag": "p", "class": "spacail-price"},
+        "Store Name": {"context": "store_name"},
+        "Shop Now Link": {"tag": "a", "class": "btn", "attr": "href", "post": absolute_url},
+    },
+}
+PRODUCT_CARD_EXTRACTOR = compile_spec(PRODUCT_CARD_SPEC)
+
+
+def deals_frame(deals):
+    """
+    DataFrame of `deals` with numeric price, discount and savings columns next to
+    the original strings, ready for sorting and filtering (see common/prices.py).
+    """
+    return add_price_columns(pd.DataFrame(deals))
+
+
+def get_all_stores(report=None):
+    """Fetch all stores from DealsHeaven 'Stores' page."""
+    response = resilient_get(STORES_URL, report=report, context="store list")
+    soup = BeautifulSoup(response.content, 'html.parser')
+    stores = []
+    for a in soup.select("ul.store-listings li a"):
+        store_name = a.text.strip()
+        store_url = urljoin(STORES_URL, a.get("href", "").strip())
+        if store_name and store_url:
+            stores.append({"name": store_name, "url": store_url})
+    return stores
+
+
+def page_url(store_url, page, search_query=None):
+    url = f"{store_url}?page={page}"
+    if search_query:
+        url += f"&keyword={search_query}"
+    return url
+
+
+def fetch_page(store_info, page, search_query=None, report=None, request_slot=None):
+    """
+    Download one listing page and return its soup. Every attempt is rate
+    limited per host; transient failures are retried with backoff.
+    `request_slot` is held around each request only (see resilient_get).
+    """
+    url = page_url(store_info['url'], page, search_query)
+    response = resilient_get(
+        url, report=report, context=f"{store_info['name']} page {page}",
+        before_attempt=get_rate_limiter().acquire, request_slot=request_slot
+    )
+    return parse_listing_html(response.content)
+
+
+def parse_listing_html(content, fast=True):
+    """
+    Parse a listing page. The fast path builds only the product cards and the
+    pagination block with lxml; it falls back to a full html.parser tree when
+    lxml is missing or the strained parse finds no cards.
+    """
+    if fast and FAST_PARSER:
+        soup = BeautifulSoup(content, FAST_PARSER, parse_only=LISTING_STRAINER)
+        if soup.find('div', class_='product-item-detail'):
+            return soup
+    return BeautifulSoup(content, 'html.parser')
+
+
+def parse_page_count(soup):
+    pagination = soup.find('ul', class_='pagination')
+    if pagination:
+        pages = [int(a.text) for a in pagination.find_all('a') if a.text.isdigit()]
+        return max(pages) if pages else 1
+    return 1
+
+
+def parse_products(soup, store_info):
+    """Turn the product cards of one listing page into deal dicts (one walk per card)."""
+    context = {"base_url": store_info['url'], "store_name": store_info['name']}
+    return PRODUCT_CARD_EXTRACTOR.extract(soup, context)
+
+
+def fetch_first_page(store_info, search_query=None, report=None, request_slot=None):
+    """
+    Fetch page 1 once and return (page_count, products), so opening a store
+    and scraping its first page costs a single request.
+    """
+    soup = fetch_page(store_info, 1, search_query, report, request_slot)
+    return parse_page_count(soup), parse_products(soup, store_info)
+
+
+def scrape_deals(store_info, max_pages, search_query=None,
+                 requests_per_second=DEFAULT_RATE, burst=DEFAULT_BURST, max_workers=4,
+                 first_page_products=None, report=None):
+    """
+    Scrape pages 1..max_pages concurrently under the per-host rate limit.
+    Pass `first_page_products` (from fetch_first_page) to skip re-downloading page 1.
+    Pages that still fail after retries are skipped and recorded in `report`.
+    """
+    # Pages are fetched concurrently; the per-host token bucket keeps us polite
+    get_rate_limiter().configure(urlparse(store_info['url']).netloc, requests_per_second, burst)
+
+    def scrape_page(page):
+        if page == 1 and first_page_products is not None:
+            return first_page_products
+        try:
+            return parse_products(fetch_page(store_info, page, search_query, report), store_info)
+        except Exception:
+            # Already recorded in the run report by fetch_page
+            return []
+
+    # executor.map yields results in page order regardless of completion order
+    products = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, max_pages))) as executor:
+        for page_products in executor.map(scrape_page, range(1, max_pages + 1)):
+            products.extend(page_products)
+    return products
+
+
+def seen_scope(store_url, search_query=None):
+    """Key deals are remembered under: a keyword search and the plain listing are separate feeds."""
+    keyword = (search_query or "").strip().lower()
+    return f"{store_url}|keyword={keyword}" if keyword else store_url
+
+
+class SeenDeals:
+    """Persistent set of `Shop Now Link` values already scraped, per store and search keyword."""
+
+    def __init__(self, path=SEEN_DEALS_PATH):
+        os.makedirs(Path(path).parent, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS seen_deals (
+                    store TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    PRIMARY KEY (store, link)
+                )"""
+            )
+
+    def known(self, store_url, links, search_query=None):
+        """Return the subset of `links` already recorded for `store_url` and `search_query`."""
+        links = [link for link in links if link and link != 'N/A']
+        if not links:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT link FROM seen_deals WHERE store = ? AND link IN ({','.join('?' * len(links))})",
+                [seen_scope(store_url, search_query)] + links
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add(self, store_url, links, search_query=None):
+        now = time.time()
+        scope = seen_scope(store_url, search_query)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_deals VALUES (?, ?, ?)",
+                [(scope, link, now) for link in links if link and link != 'N/A']
+            )
+
+    def forget(self, store_url):
+        """Forget every deal seen for `store_url`, with or without a keyword."""
+        keyword_prefix = f"{store_url}|keyword="
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM seen_deals WHERE store = ? OR substr(store, 1, ?) = ?",
+                (store_url, len(keyword_prefix), keyword_prefix)
+            )
+
+
+def scrape_new_deals(store_info, max_pages, search_query=None, seen=None,
+                     known_threshold=KNOWN_PAGE_THRESHOLD,
+                     requests_per_second=DEFAULT_RATE, burst=DEFAULT_BURST, report=None):
+    """
+    Incremental scrape: walk pages newest-first and stop at the first page made
+    up mostly (>= known_threshold) of deals seen on earlier runs with the same
+    search keyword. Every page, page 1 included, is downloaded fresh: a cached
+    page 1 would hide deals posted since it was fetched.
+
+    Returns (new_deals, skipped_count, pages_fetched). New deals are recorded
+    as seen before returning.
+    """
+    seen = seen or SeenDeals()
+    store_url = store_info['url']
+    get_rate_limiter().configure(urlparse(store_url).netloc, requests_per_second, burst)
+    new_deals = []
+    skipped = 0
+    pages_fetched = 0
+
+    for page in range(1, max_pages + 1):
+        try:
+            products = parse_products(fetch_page(store_info, page, search_query, report), store_info)
+        except Exception:
+            break
+        pages_fetched += 1
+        if not products:
+            break
+
+        known = seen.known(store_url, [p['Shop Now Link'] for p in products], search_query)
+        fresh = [p for p in products if p['Shop Now Link'] not in known]
+        new_deals.extend(fresh)
+        skipped += len(products) - len(fresh)
+
+        if len(products) - len(fresh) >= known_threshold * len(products):
+            break
+
+    seen.add(store_url, [p['Shop Now Link'] for p in new_deals], search_query)
+    return new_deals, skipped, pages_fetched
+
+
+if __name__ == "__main__":
+    # Incremental poll of one or more stores, e.g. every 15 minutes from cron:
+    #   python week2/dealsheaven.py amazon flipkart --pages 10
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Print deals not seen on earlier runs.")
+    parser.add_argument("stores", nargs="+", help="store names as listed on dealsheaven.in/stores")
+    parser.add_argument("--pages", type=int, default=10, help="maximum pages per store")
+    args = parser.parse_args()
+
+    wanted = {name.lower() for name in args.stores}
+    seen = SeenDeals()
+    for store in get_all_stores():
+        if store['name'].lower() not in wanted:
+            continue
+        deals, skipped, pages = scrape_new_deals(store, args.pages, seen=seen)
+        print(f"{store['name']}: {len(deals)} new, {skipped} already seen, {pages} pages fetched")
+        for deal in deals:
+            print(json.dumps(deal, ensure_ascii=False))
@@ -1,12 +1,33 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import json
 from io import BytesIO, StringIO
-from urllib.parse import urljoin
-import time
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+# Make the shared helpers in ../common importable when run via `streamlit run`
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.http_client import get_http_client
+from common.rate_limiter import DEFAULT_RATE, DEFAULT_BURST
+from common.resilience import RunReport
+from common.libraries import (
+    STATES, ALL_STATES, DEFAULT_MAX_WORKERS,
+    fetch_state_table, scrape_all_states
+)
+from common.prices import ORIGINAL_AMOUNT, CURRENT_AMOUNT, DISCOUNT_PERCENT, SAVINGS, SAVINGS_PERCENT
+import dealsheaven
+import catalog_crawl
+
+# Numeric columns added by dealsheaven.deals_frame(); sortable, with the strings kept alongside
+PRICE_COLUMN_CONFIG = {
+    ORIGINAL_AMOUNT: st.column_config.NumberColumn(format="₹%.2f"),
+    CURRENT_AMOUNT: st.column_config.NumberColumn(format="₹%.2f"),
+    SAVINGS: st.column_config.NumberColumn(format="₹%.2f"),
+    DISCOUNT_PERCENT: st.column_config.NumberColumn(format="%.0f%%"),
+    SAVINGS_PERCENT: st.column_config.NumberColumn(format="%.1f%%"),
+}
 
 # Set page config
 st.set_page_config(
@@ -103,6 +124,21 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# =============================================
+# RUN REPORT
+# =============================================
+
+def show_run_report(report):
+    """One collapsible summary of retries and failures instead of an error per page."""
+    summary = report.summary()
+    if not summary["failures"] and not summary["retries"]:
+        return
+    label = f"⚠️ {summary['failures']} failed request(s), {summary['retries']} retried"
+    with st.expander(label, expanded=bool(summary["failures"])):
+        if summary["failures"]:
+            st.dataframe(pd.DataFrame(report.as_records()), use_container_width=True)
+        st.caption(f"{summary['successes']} request(s) succeeded in run started {summary['started']}")
+
 # =============================================
 # PUBLIC LIBRARIES SCRAPER
 # =============================================
@@ -110,93 +146,47 @@ st.markdown(
 def public_libraries_app():
     st.title("📚 Public Libraries Data Explorer")
     
-    states = {
-        "Alabama": "https://publiclibraries.com/state/alabama/",
-        "Alaska": "https://publiclibraries.com/state/alaska/",
-        "Arizona": "https://publiclibraries.com/state/arizona/",
-        "Arkansas": "https://publiclibraries.com/state/arkansas/",
-        "California": "https://publiclibraries.com/state/california/",
-        "Colorado": "https://publiclibraries.com/state/colorado/",
-        "Connecticut": "https://publiclibraries.com/state/connecticut/",
-        "Delaware": "https://publiclibraries.com/state/delaware/",
-        "Florida": "https://publiclibraries.com/state/florida/",
-        "Georgia": "https://publiclibraries.com/state/georgia/",
-        "Hawaii": "https://publiclibraries.com/state/hawaii/",
-        "Idaho": "https://publiclibraries.com/state/idaho/",
-        "Illinois": "https://publiclibraries.com/state/illinois/",
-        "Indiana": "https://publiclibraries.com/state/indiana/",
-        "Iowa": "https://publiclibraries.com/state/iowa/",
-        "Kansas": "https://publiclibraries.com/state/kansas/",
-        "Kentucky": "https://publiclibraries.com/state/kentucky/",
-        "Louisiana": "https://publiclibraries.com/state/louisiana/",
-        "Maine": "https://publiclibraries.com/state/maine/",
-        "Maryland": "https://publiclibraries.com/state/maryland/",
-        "Massachusetts": "https://publiclibraries.com/state/massachusetts/",
-        "Michigan": "https://publiclibraries.com/state/michigan/",
-        "Minnesota": "https://publiclibraries.com/state/minnesota/",
-        "Mississippi": "https://publiclibraries.com/state/mississippi/",
-        "Missouri": "https://publiclibraries.com/state/missouri/",
-        "Montana": "https://publiclibraries.com/state/montana/",
-        "Nebraska": "https://publiclibraries.com/state/nebraska/",
-        "Nevada": "https://publiclibraries.com/state/nevada/",
-        "New Hampshire": "https://publiclibraries.com/state/new-hampshire/",
-        "New Jersey": "https://publiclibraries.com/state/new-jersey/",
-        "New Mexico": "https://publiclibraries.com/state/new-mexico/",
-        "New York": "https://publiclibraries.com/state/new-york/",
-        "North Carolina": "https://publiclibraries.com/state/north-carolina/",
-        "North Dakota": "https://publiclibraries.com/state/north-dakota/",
-        "Ohio": "https://publiclibraries.com/state/ohio/",
-        "Oklahoma": "https://publiclibraries.com/state/oklahoma/",
-        "Oregon": "https://publiclibraries.com/state/oregon/",
-        "Pennsylvania": "https://publiclibraries.com/state/pennsylvania/",
-        "Rhode Island": "https://publiclibraries.com/state/rhode-island/",
-        "South Carolina": "https://publiclibraries.com/state/south-carolina/",
-        "South Dakota": "https://publiclibraries.com/state/south-dakota/",
-        "Tennessee": "https://publiclibraries.com/state/tennessee/",
-        "Texas": "https://publiclibraries.com/state/texas/",
-        "Utah": "https://publiclibraries.com/state/utah/",
-        "Vermont": "https://publiclibraries.com/state/vermont/",
-        "Virginia": "https://publiclibraries.com/state/virginia/",
-        "Washington": "https://publiclibraries.com/state/washington/",
-        "West Virginia": "https://publiclibraries.com/state/west-virginia/",
-        "Wisconsin": "https://publiclibraries.com/state/wisconsin/",
-        "Wyoming": "https://publiclibraries.com/state/wyoming/"
-    }
+    states = STATES
 
-    def scrape_table(state_url):
-        try:
-            response = requests.get(state_url)
-            if response.status_code != 200:
-                st.error(f"Failed to fetch data from {state_url}")
-                return pd.DataFrame()
-
-            soup = BeautifulSoup(response.content, "html.parser")
-            table = soup.find("table")
-            if not table:
-                st.error("No table found on the page.")
-                return pd.DataFrame()
-
-            rows = table.find_all("tr")
-            data = []
-            for row in rows:
-                cols = [col.get_text(strip=True) for col in row.find_all("td")]
-                if cols:
-                    data.append(cols)
-
-            max_cols = max(len(row) for row in data) if data else 5
-            columns = ["City", "Library", "Address", "Zip", "Phone"][:max_cols]
-            return pd.DataFrame(data, columns=columns)
+    def scrape_table(state_url, report):
+        # Rows are parsed while the page streams in; show the first ones right away
+        preview = st.empty()
+        status = st.empty()
 
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+        def show_progress(chunk, rows_so_far):
+            if rows_so_far == len(chunk):
+                preview.dataframe(chunk, use_container_width=True)
+            status.caption(f"📖 Loaded {rows_so_far} libraries...")
+
+        try:
+            return fetch_state_table(state_url, report=report, on_chunk=show_progress)
+        except Exception:
+            # Recorded in the run report
             return pd.DataFrame()
+        finally:
+            preview.empty()
+            status.empty()
 
-    selected_state = st.selectbox("Select a state", list(states.keys()))
+    selected_state = st.selectbox("Select a state", list(states.keys()) + [ALL_STATES])
+
+    if selected_state == ALL_STATES:
+        max_workers = st.slider(
+            "Concurrent requests",
+            min_value=1,
+            max_value=len(states),
+            value=DEFAULT_MAX_WORKERS,
+            help="Maximum number of state pages fetched at the same time"
+        )
     
     if st.button("🚀 Fetch Library Data", type="primary"):
+        report = RunReport(f"Libraries: {selected_state}")
         with st.spinner("🔍 Scanning library databases..."):
-            state_url = states[selected_state]
-            df = scrape_table(state_url)
+            if selected_state == ALL_STATES:
+                df, _ = scrape_all_states(states, max_workers=max_workers, report=report)
+            else:
+                state_url = states[selected_state]
+                df = scrape_table(state_url, report)
+        show_run_report(report)
 
         if not df.empty:
             st.success(f"✅ Found {len(df)} libraries in {selected_state}!")
@@ -244,92 +234,61 @@ def dealsheaven_app():
     @st.cache_data(ttl=3600)
     def get_all_stores():
         try:
-            url = "https://dealsheaven.in/stores"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            stores = []
-            for a in soup.select("ul.store-listings li a"):
-                store_name = a.text.strip()
-                store_url = urljoin(url, a.get("href", "").strip())
-                if store_name and store_url:
-                    stores.append({"name": store_name, "url": store_url})
-            return stores
+            return dealsheaven.get_all_stores()
         except Exception as e:
             st.error(f"Error fetching stores: {e}")
             return []
 
-    def get_page_count(store_url, search_query=None):
-        try:
-            url = f"{store_url}?keyword={search_query}" if search_query else store_url
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            pagination = soup.find('ul', class_='pagination')
-            if pagination:
-                pages = [int(a.text) for a in pagination.find_all('a') if a.text.isdigit()]
-                return max(pages) if pages else 1
-            return 1
-        except Exception as e:
-            st.error(f"Error fetching page count: {e}")
-            return 1
-
-    def scrape_deals(store_info, max_pages, search_query=None):
-        products = []
-        store_url = store_info['url']
-        store_name = store_info['name']
-        
-        for page in range(1, max_pages + 1):
-            try:
-                if page > 1:
-                    time.sleep(1.5)
-                
-                base_url = f"{store_url}?page={page}"
-                if search_query:
-                    base_url += f"&keyword={search_query}"
-                
-                response = requests.get(base_url, timeout=15)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.content, 'html.parser')
-                product_cards = soup.find_all('div', class_='product-item-detail')
-                
-                if not product_cards:
-                    continue
-
-                for card in product_cards:
-                    try:
-                        if card.find('div', class_='ad-div'):
-                            continue
-
-                        product_name = card.find('h3').text.strip() if card.find('h3') else 'N/A'
-                        img_tag = card.find('img', class_='lazy')
-                        image_url = (img_tag.get('data-src') or img_tag.get('src')) if img_tag else 'N/A'
-                        if image_url and image_url.startswith('//'):
-                            image_url = f'https:{image_url}'
-                        
-                        link_tag = card.find('a', class_='btn')
-                        shop_link = urljoin(store_url, link_tag['href']) if link_tag else 'N/A'
-                        
-                        products.append({
-                            'Product Name': product_name,
-                            'Image URL': image_url,
-                            'Discount': card.find('div', class_='discount').text.strip() if card.find('div', class_='discount') else 'N/A',
-                            'Original Price': card.find('p', class_='price').text.strip() if card.find('p', class_='price') else 'N/A',
-                            'Current Price': card.find('p', class_='spacail-price').text.strip() if card.find('p', class_='spacail-price') else 'N/A',
-                            'Store Name': store_name,
-                            'Shop Now Link': shop_link
-                        })
-                    except Exception:
-                        continue
-            except Exception:
-                continue
-        return products
+    # Page 1 gives both the page count and the first products; keep it per
+    # (store, keyword) so widget reruns don't hit the site again
+    @st.cache_data(ttl=600, show_spinner=False)
+    def get_first_page(store_info, search_query=None):
+        return dealsheaven.fetch_first_page(store_info, search_query)
 
     # UI Components
     stores = get_all_stores()
     if not stores:
         st.error("Failed to load stores. Please try again later.")
         return
+
+    with st.expander(f"🌐 Crawl the whole catalog ({len(stores)} stores)"):
+        crawl_cols = st.columns(3)
+        with crawl_cols[0]:
+            crawl_workers = st.slider("Total concurrent requests", 1, 32, catalog_crawl.DEFAULT_WORKERS)
+        with crawl_cols[1]:
+            crawl_per_host = st.slider("Per-host connections", 1, 16, catalog_crawl.DEFAULT_PER_HOST)
+        with crawl_cols[2]:
+            crawl_rate = st.number_input("Requests/sec per host", 0.1, 50.0, DEFAULT_RATE, step=0.5)
+
+        if st.button("🌐 Crawl All Stores"):
+            progress_bar = st.progress(0.0)
+            status = st.empty()
+
+            def show_progress(p):
+                eta = f"~{p.eta:.0f}s left" if p.eta is not None else "estimating time left..."
+                progress_bar.progress(min(p.fraction, 1.0))
+                status.text(f"{p.done}/{p.total} pages · {p.deals} deals · {eta}")
+
+            run_report = RunReport("Catalog crawl")
+            catalog, report = catalog_crawl.crawl_catalog(
+                stores, max_workers=crawl_workers, per_host=crawl_per_host,
+                requests_per_second=crawl_rate, burst=max(1, crawl_per_host),
+                progress=show_progress, run_report=run_report
+            )
+            status.text(
+                f"Done in {report['seconds']}s: {len(catalog)} unique deals from "
+                f"{report['pages_fetched']} pages ({report['duplicates_removed']} duplicates removed)"
+            )
+            show_run_report(run_report)
+            if catalog:
+                catalog_df = dealsheaven.deals_frame(catalog)
+                st.dataframe(catalog_df, column_config=PRICE_COLUMN_CONFIG, use_container_width=True)
+                st.download_button(
+                    "📥 Catalog CSV",
+                    data=catalog_df.to_csv(index=False).encode('utf-8'),
+                    file_name="dealsheaven_catalog.csv",
+                    mime="text/csv"
+                )
     
     selected_store = st.selectbox(
         "Select Store", 
@@ -342,7 +301,11 @@ def dealsheaven_app():
         search_query = st.text_input("🔍 Search products (optional)", key="search_input")
         
         with st.spinner("📡 Connecting to store..."):
-            page_count = get_page_count(selected_store['url'], search_query)
+            try:
+                page_count, first_page_products = get_first_page(selected_store, search_query)
+            except Exception as e:
+                st.error(f"Error fetching page count: {e}")
+                page_count, first_page_products = 1, None
         
         max_pages = st.selectbox(
             "Pages to scan",
@@ -351,17 +314,61 @@ def dealsheaven_app():
             help="Number of pages to search through"
         )
 
+        # The limiter keeps one bucket per host, and every store lives on the same host,
+        # so the setting (and its widget state) is per host, shared by all stores
+        store_host = urlparse(selected_store['url']).netloc
+        with st.expander(f"⚙️ Request rate for {store_host} (all stores)"):
+            rate_cols = st.columns(2)
+            with rate_cols[0]:
+                requests_per_second = st.number_input(
+                    "Requests per second",
+                    min_value=0.1,
+                    max_value=20.0,
+                    value=DEFAULT_RATE,
+                    step=0.5,
+                    key=f"rate_{store_host}"
+                )
+            with rate_cols[1]:
+                burst = st.number_input(
+                    "Burst",
+                    min_value=1,
+                    max_value=20,
+                    value=DEFAULT_BURST,
+                    key=f"burst_{store_host}"
+                )
+
+        only_new = st.checkbox(
+            "🆕 Only new deals since last run",
+            help="Stops paging once a page is mostly deals already seen for this store and search"
+        )
+
         if st.button("🚀 Start Scraping", type="primary"):
+            report = RunReport(f"DealsHeaven: {selected_store['name']}")
             with st.spinner(f"🕵️ Scanning {selected_store['name']}..."):
-                deals = scrape_deals(selected_store, max_pages, search_query)
+                if only_new:
+                    deals, skipped, pages_fetched = dealsheaven.scrape_new_deals(
+                        selected_store, max_pages, search_query,
+                        requests_per_second=requests_per_second, burst=burst,
+                        report=report
+                    )
+                    st.info(f"Skipped {skipped} already-seen deals after fetching {pages_fetched} page(s).")
+                else:
+                    deals = dealsheaven.scrape_deals(
+                        selected_store, max_pages, search_query,
+                        requests_per_second=requests_per_second, burst=burst,
+                        first_page_products=first_page_products, report=report
+                    )
+            show_run_report(report)
             
             if deals:
                 st.success(f"🎉 Found {len(deals)} deals!")
+                deals_df = dealsheaven.deals_frame(deals)
                 st.dataframe(
-                    pd.DataFrame(deals),
+                    deals_df,
                     column_config={
                         "Image URL": st.column_config.ImageColumn(width="small"),
-                        "Shop Now Link": st.column_config.LinkColumn()
+                        "Shop Now Link": st.column_config.LinkColumn(),
+                        **PRICE_COLUMN_CONFIG
                     },
                     use_container_width=True
                 )
@@ -373,13 +380,13 @@ def dealsheaven_app():
                 with cols[0]:
                     st.download_button(
                         "📥 CSV",
-                        data=pd.DataFrame(deals).to_csv(index=False).encode('utf-8'),
+                        data=deals_df.to_csv(index=False).encode('utf-8'),
                         file_name=f"{selected_store['name']}_deals.csv",
                         mime="text/csv"
                     )
                 with cols[1]:
                     excel_data = BytesIO()
-                    pd.DataFrame(deals).to_excel(excel_data, index=False)
+                    deals_df.to_excel(excel_data, index=False)
                     st.download_button(
                         "📊 Excel",
                         data=excel_data,
@@ -423,6 +430,15 @@ def main():
     elif scraper_choice == "DealsHeaven Scraper":
         dealsheaven_app()
 
+    # Rendered last so the numbers include this run's requests
+    with st.sidebar.expander("🔌 Connection Stats"):
+        stats = get_http_client().stats()
+        st.write(f"Requests: {stats['requests']}")
+        st.write(f"New connections: {stats['new_connections']}")
+        st.write(f"Reused connections: {stats['reused_connections']} ({stats['reuse_ratio']:.0%})")
+        if stats['http2_requests']:
+            st.write(f"HTTP/2 requests: {stats['http2_requests']}")
+
 if __name__ == "__main__":
     main()
 #adding css
\ No newline at end of file